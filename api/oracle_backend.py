@@ -10,17 +10,38 @@ Versión: 50 personajes + Dashboard + Sugerencias + Pistas
 - ✅ Exportación TXT
 """
 
-from flask import Flask, request, jsonify, render_template_string, send_file, make_response
+from flask import Flask, Response, g, request, jsonify, render_template_string, send_file, make_response
 from flask_cors import CORS
 from io import BytesIO, StringIO
-from collections import Counter, defaultdict
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict, defaultdict, deque
+from collections.abc import Mapping, Sequence
+from contextlib import contextmanager, redirect_stdout
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+import argparse
+import atexit
+import hashlib
+import heapq
+import math
+import mmap
+import queue
 import random
+import secrets
+import signal
+import sqlite3
+import struct
+import sys
+import threading
+import time
 import unicodedata
 import json
 import os
 import re
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
 
 app = Flask(__name__)
 CORS(app)
@@ -29,151 +50,930 @@ CORS(app)
 # CONFIGURACIÓN
 # ===================================================================
 
-REGISTRO_HUECOS_FILE = "huecos_diccionario.json"
+REGISTRO_HUECOS_FILE = "huecos_diccionario.jsonl"
+REGISTRO_HUECOS_LEGACY_FILE = "huecos_diccionario.json"
 METRICAS_FILE = "metricas_oracle.json"
+METRICAS_LOG_FILE = "metricas_oracle.log"
 PERSONAJES_FILE = "personajes.json"
 MAX_PREGUNTAS = 20
 
+# Métricas: los eventos se anexan al log y se vuelcan por lotes; cada
+# cierto número de eventos se compactan en el snapshot METRICAS_FILE.
+METRICAS_FLUSH_SEGUNDOS = float(os.environ.get('ORACLE_METRICAS_FLUSH_SEGUNDOS', 2.0))
+METRICAS_FLUSH_EVENTOS = int(os.environ.get('ORACLE_METRICAS_FLUSH_EVENTOS', 50))
+METRICAS_COMPACTAR_EVENTOS = int(os.environ.get('ORACLE_METRICAS_COMPACTAR_EVENTOS', 5000))
+# preguntas_frecuentes: cuántas preguntas distintas se siguen (Space-Saving) y cuántas ve el dashboard
+PREGUNTAS_FRECUENTES_MAX = int(os.environ.get('ORACLE_PREGUNTAS_FRECUENTES_MAX', 1000))
+PREGUNTAS_FRECUENTES_TOP = int(os.environ.get('ORACLE_PREGUNTAS_FRECUENTES_TOP', 20))
+
+# Huecos: log JSON lines que rota al superar HUECOS_ROTAR_BYTES y anillo en
+# memoria con los últimos HUECOS_EN_MEMORIA para el dashboard.
+HUECOS_ROTAR_BYTES = int(os.environ.get('ORACLE_HUECOS_ROTAR_BYTES', 5 * 1024 * 1024))
+HUECOS_EN_MEMORIA = int(os.environ.get('ORACLE_HUECOS_EN_MEMORIA', 1000))
+
+# Analizador: ORACLE_ANALIZADOR_LEGACY=1 usa la cadena de ifs original
+# (para pruebas diferenciales contra el motor compilado de reglas).
+ANALIZADOR_LEGACY = os.environ.get('ORACLE_ANALIZADOR_LEGACY', '0') == '1'
+ANALIZADOR_CACHE_PALABRAS = int(os.environ.get('ORACLE_ANALIZADOR_CACHE_PALABRAS', 4096))
+NORMALIZADOR_CACHE = int(os.environ.get('ORACLE_NORMALIZADOR_CACHE', 8192))
+
+# Antes de dar una pregunta por hueco se reintenta con lemas y erratas corregidas
+ANALIZADOR_LEMAS = os.environ.get('ORACLE_ANALIZADOR_LEMAS', '1') == '1'
+ANALIZADOR_ERRATA_MINIMA = int(os.environ.get('ORACLE_ANALIZADOR_ERRATA_MINIMA', 5))
+
+# Caché LRU de respuestas por (pregunta normalizada, personaje, versión del roster); 0 = sin caché
+RESPUESTAS_CACHE = int(os.environ.get('ORACLE_RESPUESTAS_CACHE', 50000))
+
+# Sesiones: capacidad máxima (desalojo LRU), expiración por inactividad
+# y cada cuánto pasa el barrendero en segundo plano.
+SESIONES_MAX = int(os.environ.get('ORACLE_SESIONES_MAX', 10000))
+SESIONES_TTL_SEGUNDOS = float(os.environ.get('ORACLE_SESIONES_TTL_SEGUNDOS', 1800))
+SESIONES_BARRIDO_SEGUNDOS = float(os.environ.get('ORACLE_SESIONES_BARRIDO_SEGUNDOS', 60))
+
+# Almacén de sesiones y métricas: 'memoria' (un solo proceso) o 'sqlite'
+# (compartido entre workers de gunicorn vía un fichero SQLite en modo WAL).
+ALMACEN = os.environ.get('ORACLE_ALMACEN', 'memoria')
+ALMACEN_SQLITE = os.environ.get('ORACLE_ALMACEN_SQLITE', 'oracle_estado.db')
+
+# Con ORACLE_PERSONAJE_CLIENTE=0 solo se admiten partidas con token: el
+# personaje secreto nunca sale del servidor ni se acepta desde el cliente.
+PERSONAJE_CLIENTE = os.environ.get('ORACLE_PERSONAJE_CLIENTE', '1') == '1'
+
+# Modo inverso: el Oráculo adivina el personaje que piensa el jugador
+ORACULO_MAX_INTENTOS = int(os.environ.get('ORACLE_ORACULO_MAX_INTENTOS', 3))
+
+# Recarga en caliente de personajes.json (0 = sin vigilar el archivo)
+PERSONAJES_VIGILAR_SEGUNDOS = float(os.environ.get('ORACLE_PERSONAJES_VIGILAR_SEGUNDOS', 10))
+CATALOGO_VERSIONES = max(1, int(os.environ.get('ORACLE_CATALOGO_VERSIONES', 4)))
+
+# Roster compilado (compilar-roster): se usa si corresponde al personajes.json actual
+ROSTER_BINARIO_FILE = "personajes.bin"
+ROSTER_BINARIO = os.environ.get('ORACLE_ROSTER_BINARIO', '1') == '1'
+ROSTER_CACHE_PERSONAJES = int(os.environ.get('ORACLE_ROSTER_CACHE_PERSONAJES', 1024))
+
+# Adivinanzas con erratas: similitud mínima (0-1) y longitud mínima de una palabra suelta del nombre
+ADIVINAR_DIFUSO = os.environ.get('ORACLE_ADIVINAR_DIFUSO', '1') == '1'
+ADIVINAR_UMBRAL = float(os.environ.get('ORACLE_ADIVINAR_UMBRAL', 0.8))
+ADIVINAR_PALABRA_MINIMA = int(os.environ.get('ORACLE_ADIVINAR_PALABRA_MINIMA', 4))
+ADMIN_TOKEN = os.environ.get('ORACLE_ADMIN_TOKEN', '')
+
+# /api/oracle/batch: tope de preguntas y de celdas (preguntas × personajes) por petición
+LOTE_MAX_PREGUNTAS = int(os.environ.get('ORACLE_LOTE_MAX_PREGUNTAS', 1000))
+LOTE_MAX_CELDAS = int(os.environ.get('ORACLE_LOTE_MAX_CELDAS', 1000000))
+
+# Respuestas del juego con orjson si está instalado (0 = siempre json estándar)
+JSON_RAPIDO = os.environ.get('ORACLE_JSON_RAPIDO', '1') == '1'
+
+# Persistencia: un hilo hace todas las escrituras. Cola acotada, tope de líneas
+# pendientes por escritor y qué hacer al llegar al tope ('descartar' o 'esperar').
+PERSISTENCIA_COLA = int(os.environ.get('ORACLE_PERSISTENCIA_COLA', 256))
+PERSISTENCIA_MAX_PENDIENTES = int(os.environ.get('ORACLE_PERSISTENCIA_MAX_PENDIENTES', 10000))
+PERSISTENCIA_POLITICA = os.environ.get('ORACLE_PERSISTENCIA_POLITICA', 'descartar')
+PERSISTENCIA_ESPERA_SEGUNDOS = float(os.environ.get('ORACLE_PERSISTENCIA_ESPERA_SEGUNDOS', 0.05))
+PERSISTENCIA_CIERRE_SEGUNDOS = float(os.environ.get('ORACLE_PERSISTENCIA_CIERRE_SEGUNDOS', 10))
+
+# Latencias por endpoint, acción y fase interna (/metrics y dashboard)
+TELEMETRIA = os.environ.get('ORACLE_TELEMETRIA', '1') == '1'
+
 
 # ===================================================================
 # CARGADOR DE PERSONAJES (RUTA ABSOLUTA)
 # ===================================================================
 
-def cargar_personajes(archivo: str = PERSONAJES_FILE) -> List[Dict]:
+def ruta_personajes(archivo: str = PERSONAJES_FILE) -> str:
+    """El archivo se busca en el MISMO directorio donde está este script."""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), archivo)
+
+
+def version_contenido(contenido: bytes) -> str:
+    return hashlib.sha1(contenido).hexdigest()[:12]
+
+
+def version_archivo(ruta: str) -> str:
+    with open(ruta, 'rb') as f:
+        return version_contenido(f.read())
+
+
+def leer_personajes(ruta: str) -> Tuple[List[Dict], str]:
+    """
+    (personajes, versión) del archivo. La versión es un hash del contenido,
+    así que todos los workers que leen el mismo archivo la comparten.
+    """
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    return json.loads(contenido).get('personajes', []), version_contenido(contenido)
+
+
+def cargar_personajes(archivo: str = PERSONAJES_FILE) -> Tuple[List[Dict], str]:
     """
     Carga personajes desde archivo JSON externo.
     Busca en el MISMO directorio donde está este script.
     """
     try:
-        directorio_actual = os.path.dirname(os.path.abspath(__file__))
-        ruta_completa = os.path.join(directorio_actual, archivo)
+        ruta_completa = ruta_personajes(archivo)
 
         if os.path.exists(ruta_completa):
-            with open(ruta_completa, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                personajes = data.get('personajes', [])
-                print(f"✅ {len(personajes)} personajes cargados desde {ruta_completa}")
-                return personajes
+            personajes, version = leer_personajes(ruta_completa)
+            print(f"✅ {len(personajes)} personajes cargados desde {ruta_completa}", file=sys.stderr)
+            return personajes, version
         else:
-            print(f"⚠️  Archivo {ruta_completa} no encontrado")
-            print(f"📁 Directorio actual: {os.getcwd()}")
-            print(f"📁 Archivos en el directorio: {os.listdir('.')}")
-            return []
+            print(f"⚠️  Archivo {ruta_completa} no encontrado", file=sys.stderr)
+            print(f"📁 Directorio actual: {os.getcwd()}", file=sys.stderr)
+            print(f"📁 Archivos en el directorio: {os.listdir('.')}", file=sys.stderr)
+            return [], ''
     except Exception as e:
-        print(f"❌ Error cargando personajes: {e}")
-        return []
+        print(f"❌ Error cargando personajes: {e}", file=sys.stderr)
+        return [], ''
 
-PERSONAJES = cargar_personajes()
 
-if not PERSONAJES:
-    print("=" * 60)
-    print("⚠️  ADVERTENCIA: No se cargaron personajes")
-    print("Asegúrate de que personajes.json existe en el mismo directorio")
-    print("=" * 60)
+# ===================================================================
+# TELEMETRÍA
+# ===================================================================
+
+class Histograma:
+    """Histograma acumulativo al estilo Prometheus: límites superiores en segundos (le) más +Inf."""
+    __slots__ = ('limites', 'cubetas', 'suma', 'total')
+
+    def __init__(self, limites: Tuple[float, ...]):
+        self.limites = limites
+        self.cubetas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, segundos: float):
+        self.cubetas[bisect_left(self.limites, segundos)] += 1
+        self.suma += segundos
+        self.total += 1
+
+    def cuantil(self, q: float) -> float:
+        """Estimación por interpolación lineal dentro de la cubeta, como histogram_quantile."""
+        objetivo = q * self.total
+        acumulado = 0
+        for i, n in enumerate(self.cubetas):
+            if n and acumulado + n >= objetivo:
+                if i == len(self.limites):
+                    return self.limites[-1]
+                inferior = self.limites[i - 1] if i else 0.0
+                return inferior + (self.limites[i] - inferior) * (objetivo - acumulado) / n
+            acumulado += n
+        return 0.0
+
+
+class Telemetria:
+    """
+    Latencias y contadores del propio servidor, en memoria y por proceso
+    (con varios workers cada uno publica los suyos). Cada serie es una
+    métrica más sus etiquetas; se exporta en texto Prometheus en /metrics
+    y resumida en JSON en /api/dashboard/stats.
+    """
+    LIMITES = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+               0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+    AYUDA = {
+        'oracle_peticion_segundos': ('histogram', 'Latencia de las peticiones HTTP por endpoint'),
+        'oracle_accion_segundos': ('histogram', 'Latencia de /api/oracle por acción'),
+        'oracle_fase_segundos': ('histogram', 'Tiempo de las fases internas: normalizador, analizador y persistencia'),
+        'oracle_peticiones_total': ('counter', 'Peticiones HTTP por endpoint, método y estado'),
+        'oracle_errores_total': ('counter', 'Peticiones HTTP que terminaron con estado 5xx'),
+        'oracle_persistencia_total': ('counter', 'Tareas del trabajador de persistencia por escritor y resultado'),
+        'oracle_persistencia_cola': ('gauge', 'Tareas esperando en la cola de persistencia'),
+    }
+    SECCIONES = {
+        'oracle_peticion_segundos': ('endpoints', 'endpoint'),
+        'oracle_accion_segundos': ('acciones', 'accion'),
+        'oracle_fase_segundos': ('fases', 'fase'),
+    }
+
+    def __init__(self, activa: bool = True):
+        self.activa = activa
+        self.inicio = time.time()
+        self._lock = threading.Lock()
+        self.histogramas: Dict[Tuple[str, Tuple], Histograma] = {}
+        self.contadores: Counter = Counter()
+        self.medidores: Dict[str, object] = {}
+
+    def medir(self, metrica: str, funcion):
+        """Registra un gauge que se lee al exportar."""
+        self.medidores[metrica] = funcion
+
+    def observar(self, metrica: str, segundos: float, **etiquetas):
+        if not self.activa:
+            return
+        clave = (metrica, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            histograma = self.histogramas.get(clave)
+            if histograma is None:
+                histograma = self.histogramas[clave] = Histograma(self.LIMITES)
+            histograma.observar(segundos)
+
+    def contar(self, metrica: str, cantidad: int = 1, **etiquetas):
+        if self.activa:
+            with self._lock:
+                self.contadores[(metrica, tuple(sorted(etiquetas.items())))] += cantidad
+
+    @contextmanager
+    def fase(self, nombre: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar('oracle_fase_segundos', time.perf_counter() - inicio, fase=nombre)
+
+    @staticmethod
+    def _etiquetas(pares) -> str:
+        if not pares:
+            return ''
+        escapar = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return '{' + ','.join(f'{k}="{escapar(v)}"' for k, v in pares) + '}'
+
+    def prometheus(self) -> str:
+        """Formato de exposición de texto de Prometheus (0.0.4)."""
+        with self._lock:
+            histogramas = sorted((c, h.cubetas[:], h.suma, h.total) for c, h in self.histogramas.items())
+            contadores = sorted(self.contadores.items())
+        lineas = []
+        vistas = set()
+
+        def cabecera(metrica: str):
+            if metrica not in vistas:
+                vistas.add(metrica)
+                tipo, ayuda = self.AYUDA.get(metrica, ('untyped', metrica))
+                lineas.extend((f'# HELP {metrica} {ayuda}', f'# TYPE {metrica} {tipo}'))
+
+        for (metrica, etiquetas), cubetas, suma, total in histogramas:
+            cabecera(metrica)
+            acumulado = 0
+            for limite, n in zip(self.LIMITES + (float('inf'),), cubetas):
+                acumulado += n
+                le = '+Inf' if limite == float('inf') else repr(limite)
+                lineas.append(f'{metrica}_bucket{self._etiquetas(etiquetas + (("le", le),))} {acumulado}')
+            lineas.append(f'{metrica}_sum{self._etiquetas(etiquetas)} {suma:.6f}')
+            lineas.append(f'{metrica}_count{self._etiquetas(etiquetas)} {total}')
+        for (metrica, etiquetas), valor in contadores:
+            cabecera(metrica)
+            lineas.append(f'{metrica}{self._etiquetas(etiquetas)} {valor}')
+        for metrica, funcion in sorted(self.medidores.items()):
+            cabecera(metrica)
+            lineas.append(f'{metrica} {funcion()}')
+        cabecera('oracle_inicio_segundos')
+        lineas.append(f'oracle_inicio_segundos {self.inicio:.3f}')
+        return '\n'.join(lineas) + '\n'
+
+    def resumen(self) -> Dict:
+        """Por endpoint, acción y fase: n, media y p50/p95/p99 estimados (ms); más peticiones y errores."""
+        with self._lock:
+            series = [(clave, h.total, h.suma, [h.cuantil(q) for q in (0.5, 0.95, 0.99)])
+                      for clave, h in self.histogramas.items()]
+            contadores = list(self.contadores.items())
+        resumen = {
+            'activa': self.activa,
+            'desde': datetime.fromtimestamp(self.inicio).isoformat(timespec='seconds'),
+            'peticiones': sum(v for (m, _), v in contadores if m == 'oracle_peticiones_total'),
+            'errores': sum(v for (m, _), v in contadores if m == 'oracle_errores_total'),
+            'endpoints': {}, 'acciones': {}, 'fases': {}
+        }
+        for (metrica, etiquetas), total, suma, (p50, p95, p99) in sorted(series):
+            seccion, etiqueta = self.SECCIONES.get(metrica, (None, None))
+            if seccion is None or not total:
+                continue
+            resumen[seccion][dict(etiquetas).get(etiqueta, '?')] = {
+                'n': total,
+                'media_ms': round(suma / total * 1000, 3),
+                'p50_ms': round(p50 * 1000, 3),
+                'p95_ms': round(p95 * 1000, 3),
+                'p99_ms': round(p99 * 1000, 3)
+            }
+        return resumen
+
+
+telemetria = Telemetria(TELEMETRIA)
+
+
+# ===================================================================
+# PERSISTENCIA EN SEGUNDO PLANO
+# ===================================================================
+
+class TrabajadorPersistencia:
+    """
+    Un único hilo que hace todas las escrituras a disco fuera de las
+    peticiones. Los escritores acumulan líneas en memoria y envían su función
+    de volcado; mientras esa función espera en la cola, los envíos repetidos
+    se funden en uno (cada volcado se lleva todo lo acumulado). La cola está
+    acotada y cada escritor limita sus líneas pendientes: al llenarse se
+    descarta la línea ('descartar') o se espera un poco a que el hilo vacíe
+    ('esperar'). Envíos, fusiones, descartes y fallos se cuentan por escritor.
+    """
+    RESULTADOS = ('enviadas', 'coalescidas', 'ejecutadas', 'fallidas', 'descartadas', 'esperas')
+
+    def __init__(self, capacidad: int = PERSISTENCIA_COLA, max_pendientes: int = PERSISTENCIA_MAX_PENDIENTES,
+                 politica: str = PERSISTENCIA_POLITICA, espera: float = PERSISTENCIA_ESPERA_SEGUNDOS):
+        self.max_pendientes = max_pendientes
+        self.politica = politica
+        self.espera = espera
+        self._cola: queue.Queue = queue.Queue(maxsize=capacidad)
+        self._lock = threading.Lock()
+        self._progreso = threading.Condition()
+        self._encoladas = set()
+        self._periodicas: Dict = {}
+        self.contadores: Counter = Counter()
+        self._hilo = threading.Thread(target=self._bucle, name='oracle-persistencia', daemon=True)
+        self._hilo.start()
+
+    def _contar(self, nombre: str, resultado: str):
+        with self._lock:
+            self.contadores[(nombre, resultado)] += 1
+        telemetria.contar('oracle_persistencia_total', escritor=nombre, resultado=resultado)
+
+    def enviar(self, funcion, nombre: str) -> bool:
+        """Encola funcion salvo que ya esté esperando; nunca bloquea a quien envía."""
+        with self._lock:
+            if funcion in self._encoladas:
+                self.contadores[(nombre, 'coalescidas')] += 1
+                coalescida = True
+            else:
+                self._encoladas.add(funcion)
+                coalescida = False
+        if coalescida:
+            telemetria.contar('oracle_persistencia_total', escritor=nombre, resultado='coalescidas')
+            return True
+        try:
+            self._cola.put_nowait((funcion, nombre))
+        except queue.Full:
+            # Lo acumulado sigue en el escritor: lo recogerá su próximo envío o el volcado periódico
+            with self._lock:
+                self._encoladas.discard(funcion)
+            self._contar(nombre, 'descartadas')
+            return False
+        self._contar(nombre, 'enviadas')
+        return True
+
+    def admitir(self, nombre: str, pendientes, volcar) -> bool:
+        """
+        ¿Cabe una línea más en el escritor? pendientes() da cuántas tiene
+        acumuladas y volcar es su función de volcado. Con la política
+        'esperar' se le da al hilo hasta 'espera' segundos antes de descartar.
+        """
+        if pendientes() < self.max_pendientes:
+            return True
+        if self.politica == 'esperar' and threading.current_thread() is not self._hilo:
+            self._contar(nombre, 'esperas')
+            self.enviar(volcar, nombre)
+            limite = time.monotonic() + self.espera
+            with self._progreso:
+                while pendientes() >= self.max_pendientes and time.monotonic() < limite:
+                    self._progreso.wait(limite - time.monotonic())
+            if pendientes() < self.max_pendientes:
+                return True
+        self._contar(nombre, 'descartadas')
+        return False
+
+    def periodica(self, funcion, segundos: float, nombre: str):
+        """Envía funcion cada 'segundos' y también al vaciar (p. ej. en SIGTERM)."""
+        with self._lock:
+            self._periodicas[funcion] = (segundos, time.monotonic() + segundos, nombre)
+
+    def cancelar(self, funcion):
+        with self._lock:
+            self._periodicas.pop(funcion, None)
+
+    def _bucle(self):
+        while True:
+            with self._lock:
+                proxima = min((p[1] for p in self._periodicas.values()), default=time.monotonic() + 1.0)
+            try:
+                funcion, nombre = self._cola.get(timeout=max(0.0, proxima - time.monotonic()))
+            except queue.Empty:
+                funcion = None
+            if funcion is not None:
+                with self._lock:
+                    self._encoladas.discard(funcion)
+                self._ejecutar(funcion, nombre)
+                self._cola.task_done()
+            ahora = time.monotonic()
+            with self._lock:
+                vencidas = [(f, n) for f, (s, p, n) in self._periodicas.items() if p <= ahora]
+                for f, _ in vencidas:
+                    segundos, _, nombre = self._periodicas[f]
+                    self._periodicas[f] = (segundos, ahora + segundos, nombre)
+            for f, n in vencidas:
+                self._ejecutar(f, n)
+
+    def _ejecutar(self, funcion, nombre: Optional[str]):
+        try:
+            funcion()
+            if nombre:
+                self._contar(nombre, 'ejecutadas')
+        except Exception as e:
+            print(f"⚠️ Error de persistencia ({nombre}): {e}")
+            if nombre:
+                self._contar(nombre, 'fallidas')
+        with self._progreso:
+            self._progreso.notify_all()
+
+    def vaciar(self, timeout: float = PERSISTENCIA_CIERRE_SEGUNDOS) -> bool:
+        """Ejecuta lo pendiente y las periódicas; True si el hilo terminó antes del timeout."""
+        if threading.current_thread() is self._hilo or not self._hilo.is_alive():
+            return False
+        with self._lock:
+            periodicas = [(f, n) for f, (_, _, n) in self._periodicas.items()]
+        for funcion, nombre in periodicas:
+            self.enviar(funcion, nombre)
+        hecho = threading.Event()
+        try:
+            self._cola.put((hecho.set, None), timeout=timeout)
+        except queue.Full:
+            return False
+        return hecho.wait(timeout)
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            contadores = dict(self.contadores)
+        escritores = sorted({nombre for nombre, _ in contadores})
+        return {
+            'politica': self.politica,
+            'cola': self._cola.qsize(),
+            'capacidad': self._cola.maxsize,
+            'max_pendientes': self.max_pendientes,
+            'escritores': {nombre: {r: contadores.get((nombre, r), 0) for r in self.RESULTADOS}
+                           for nombre in escritores}
+        }
+
+
+persistencia = TrabajadorPersistencia()
+telemetria.medir('oracle_persistencia_cola', persistencia._cola.qsize)
+atexit.register(persistencia.vaciar)
+
+
+def instalar_vaciado_en_sigterm():
+    """
+    En SIGTERM vacía el trabajador y luego sigue con el manejador que ya
+    hubiera (el de gunicorn, por ejemplo) o termina el proceso.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    anterior = signal.getsignal(signal.SIGTERM)
+
+    def al_terminar(senal, marco):
+        persistencia.vaciar()
+        if callable(anterior):
+            anterior(senal, marco)
+        elif anterior != signal.SIG_IGN:
+            raise SystemExit(128 + senal)
+
+    signal.signal(signal.SIGTERM, al_terminar)
+
+
+instalar_vaciado_en_sigterm()
+
+
+# ===================================================================
+# ALMACÉN COMPARTIDO (SQLITE)
+# ===================================================================
+
+class BaseSQLite:
+    """
+    Conexión SQLite en modo WAL, una por hilo. Varios procesos pueden abrir
+    el mismo fichero; las escrituras que deben ser exclusivas entre workers
+    van dentro de transaccion() (BEGIN IMMEDIATE).
+    """
+    ESQUEMA = ""
+
+    def __init__(self, ruta: str = ALMACEN_SQLITE):
+        self.ruta = ruta
+        self._local = threading.local()
+        self.conexion().executescript(self.ESQUEMA)
+
+    def conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            self._local.conexion = conexion
+        return conexion
+
+    @contextmanager
+    def transaccion(self):
+        conexion = self.conexion()
+        conexion.execute('BEGIN IMMEDIATE')
+        try:
+            yield conexion
+        except Exception:
+            conexion.execute('ROLLBACK')
+            raise
+        conexion.execute('COMMIT')
 
 
 # ===================================================================
 # SISTEMA DE MÉTRICAS
 # ===================================================================
 
+class ContadorFrecuentes:
+    """
+    Heavy hitters con Space-Saving: como mucho 'capacidad' claves, cada una
+    con su cuenta y su error (la cuenta que heredó al desalojar a la mínima).
+    Toda pregunta hecha más de total / capacidad veces está dentro, y su
+    cuenta sobreestima la real como mucho en su error. Los resúmenes de
+    varios workers (o shards) se fusionan con fusionar().
+    """
+
+    def __init__(self, capacidad: int = PREGUNTAS_FRECUENTES_MAX):
+        self.capacidad = max(1, capacidad)
+        self.cuentas: Dict[str, int] = {}
+        self.errores: Dict[str, int] = {}
+        self.total = 0
+        # Montículo perezoso (cuenta, clave): las entradas viejas se descartan al buscar el mínimo
+        self._monticulo: List[Tuple[int, str]] = []
+
+    def anadir(self, clave: str, cantidad: int = 1):
+        self.total += cantidad
+        cuenta = self.cuentas.get(clave)
+        if cuenta is None:
+            error = 0
+            if len(self.cuentas) >= self.capacidad:
+                error, victima = self._minimo()
+                del self.cuentas[victima], self.errores[victima]
+            cuenta, self.errores[clave] = error, error
+        self.cuentas[clave] = cuenta + cantidad
+        heapq.heappush(self._monticulo, (cuenta + cantidad, clave))
+        if len(self._monticulo) > 4 * self.capacidad:
+            self._monticulo = [(c, k) for k, c in self.cuentas.items()]
+            heapq.heapify(self._monticulo)
+
+    def _minimo(self) -> Tuple[int, str]:
+        while True:
+            cuenta, clave = heapq.heappop(self._monticulo)
+            if self.cuentas.get(clave) == cuenta:
+                return cuenta, clave
+
+    def minima(self) -> int:
+        """Cuenta que se le supone a una clave ausente: la menor si el resumen está lleno."""
+        return min(self.cuentas.values()) if len(self.cuentas) >= self.capacidad else 0
+
+    def fusionar(self, otro: 'ContadorFrecuentes') -> 'ContadorFrecuentes':
+        """
+        Resumen de la unión de los dos flujos (Agarwal et al.): a una clave
+        que falta en un lado se le suma la mínima de ese lado, y se quedan
+        las 'capacidad' (las de este resumen) mayores.
+        """
+        minima_a, minima_b = self.minima(), otro.minima()
+        claves = set(self.cuentas) | set(otro.cuentas)
+        cuentas = {k: self.cuentas.get(k, minima_a) + otro.cuentas.get(k, minima_b) for k in claves}
+        resultado = ContadorFrecuentes(self.capacidad)
+        for clave, cuenta in heapq.nlargest(resultado.capacidad, cuentas.items(), key=itemgetter(1)):
+            resultado.cuentas[clave] = cuenta
+            resultado.errores[clave] = self.errores.get(clave, minima_a) + otro.errores.get(clave, minima_b)
+        resultado.total = self.total + otro.total
+        resultado._monticulo = [(c, k) for k, c in resultado.cuentas.items()]
+        heapq.heapify(resultado._monticulo)
+        return resultado
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Las n claves más frecuentes con su cuenta (cota superior de la real)."""
+        return heapq.nlargest(n or len(self.cuentas), list(self.cuentas.items()), key=itemgetter(1))
+
+    def __len__(self) -> int:
+        return len(self.cuentas)
+
+    def a_dict(self) -> Dict:
+        return {
+            'capacidad': self.capacidad,
+            'total': self.total,
+            'cuentas': dict(self.cuentas),
+            'errores': {k: e for k, e in self.errores.items() if e}
+        }
+
+    @staticmethod
+    def desde_dict(datos: Dict, capacidad: int = PREGUNTAS_FRECUENTES_MAX) -> 'ContadorFrecuentes':
+        """Desde a_dict(), o desde el mapa pregunta -> veces (exacto y sin acotar) de los snapshots antiguos."""
+        if 'cuentas' in datos:
+            cuentas, errores, total = datos['cuentas'], datos.get('errores', {}), datos.get('total', 0)
+        else:
+            cuentas, errores, total = datos, {}, sum(datos.values())
+        leido = ContadorFrecuentes(max(capacidad, len(cuentas)))
+        leido.cuentas = dict(cuentas)
+        leido.errores = {k: errores.get(k, 0) for k in cuentas}
+        leido.total = total
+        if len(leido) > capacidad:
+            # Fusionar con uno vacío de la capacidad configurada se queda con las mayores
+            return ContadorFrecuentes(capacidad).fusionar(leido)
+        leido.capacidad = max(1, capacidad)
+        leido._monticulo = [(c, k) for k, c in leido.cuentas.items()]
+        heapq.heapify(leido._monticulo)
+        return leido
+
+
+def metricas_vacias() -> Dict:
+    return {
+        "partidas_totales": 0,
+        "partidas_ganadas": 0,
+        "partidas_perdidas": 0,
+        "preguntas_totales": 0,
+        "personajes_usados": {},
+        "preguntas_frecuentes": ContadorFrecuentes(),
+        "huecos_por_categoria": {},
+        "tasa_exito_por_personaje": {},
+        "errores": []
+    }
+
+
+class RegistroMetricas:
+    """
+    Persistencia de métricas: snapshot JSON + log de eventos (una línea
+    JSON compacta por evento). Cada evento lleva un número de secuencia
+    'n'; el snapshot guarda '_secuencia' para no reaplicar eventos ya
+    compactados si el proceso muere entre escribir el snapshot y truncar el log.
+    Solo es válido con un único proceso escritor.
+    """
+    compartido = False
+
+    def __init__(self, snapshot: str = METRICAS_FILE, log: str = METRICAS_LOG_FILE):
+        self.snapshot = snapshot
+        self.log = log
+
+    def cargar(self) -> Optional[Dict]:
+        if os.path.exists(self.snapshot):
+            try:
+                with open(self.snapshot, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"⚠️ Snapshot de métricas ilegible: {e}")
+        return None
+
+    def leer_eventos(self) -> Iterator[Dict]:
+        if not os.path.exists(self.log):
+            return
+        with open(self.log, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    yield json.loads(linea)
+                except ValueError:
+                    # Última línea a medio escribir tras una caída
+                    continue
+
+    def anexar(self, lineas: List[str]):
+        with open(self.log, 'a', encoding='utf-8') as f:
+            f.write(''.join(lineas))
+
+    def compactar(self, contenido: str):
+        temporal = self.snapshot + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+        os.replace(temporal, self.snapshot)
+        open(self.log, 'w').close()
+
+
+class RegistroMetricasSQLite(BaseSQLite):
+    """
+    Misma interfaz que RegistroMetricas pero compartida entre workers: los
+    eventos se numeran con el rowid y la compactación se hace dentro de la
+    base de datos (snapshot + eventos de todos), no con la vista local.
+    """
+    compartido = True
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS metricas_eventos (n INTEGER PRIMARY KEY AUTOINCREMENT, evento TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS metricas_snapshot (clave TEXT PRIMARY KEY, contenido TEXT NOT NULL);
+    """
+
+    def cargar(self) -> Optional[Dict]:
+        fila = self.conexion().execute(
+            "SELECT contenido FROM metricas_snapshot WHERE clave = 'metricas'").fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def leer_eventos(self) -> Iterator[Dict]:
+        cursor = self.conexion().execute("SELECT n, evento FROM metricas_eventos ORDER BY n")
+        for n, linea in cursor:
+            evento = json.loads(linea)
+            evento["n"] = n
+            yield evento
+
+    def anexar(self, lineas: List[str]):
+        with self.transaccion() as conexion:
+            conexion.executemany("INSERT INTO metricas_eventos (evento) VALUES (?)", [(l,) for l in lineas])
+
+    def compactar(self, contenido: Optional[str] = None):
+        with self.transaccion():
+            metricas, secuencia = MetricasManager.leer(self)
+            contenido = json.dumps(MetricasManager.instantanea(metricas, secuencia), ensure_ascii=False)
+            self.conexion().execute(
+                "INSERT OR REPLACE INTO metricas_snapshot (clave, contenido) VALUES ('metricas', ?)", (contenido,))
+            self.conexion().execute("DELETE FROM metricas_eventos WHERE n <= ?", (secuencia,))
+
+
 class MetricasManager:
-    def __init__(self):
+    def __init__(self, registro: Optional[RegistroMetricas] = None):
+        self.registro = registro or RegistroMetricas()
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._pendientes: List[str] = []
+        self._secuencia = 0
+        self._desde_compactacion = 0
+        self._con_eventos = False
         self.metricas = self.cargar_metricas()
+        persistencia.periodica(self._persistir, METRICAS_FLUSH_SEGUNDOS, 'metricas')
+        atexit.register(self.cerrar)
 
     def cargar_metricas(self) -> Dict:
-        if os.path.exists(METRICAS_FILE):
+        metricas, self._secuencia = self.leer(self.registro)
+        return metricas
+
+    @staticmethod
+    def leer(registro) -> Tuple[Dict, int]:
+        """Snapshot + eventos posteriores del registro; devuelve (métricas, última secuencia)."""
+        metricas = metricas_vacias()
+        snapshot = registro.cargar()
+        if snapshot:
+            metricas.update(snapshot)
+            metricas["preguntas_frecuentes"] = ContadorFrecuentes.desde_dict(snapshot.get("preguntas_frecuentes") or {})
+        secuencia = metricas.pop("_secuencia", 0)
+        for evento in registro.leer_eventos():
+            if evento.get("n", 0) <= secuencia:
+                continue
+            MetricasManager._aplicar(metricas, evento)
+            secuencia = evento["n"]
+        return metricas, secuencia
+
+    @staticmethod
+    def instantanea(metricas: Dict, secuencia: int) -> Dict:
+        """Las métricas tal como se guardan en el snapshot."""
+        return dict(metricas, _secuencia=secuencia,
+                    preguntas_frecuentes=metricas["preguntas_frecuentes"].a_dict())
+
+    def vista(self) -> Dict:
+        """Métricas para el dashboard: las locales o, si el registro es compartido, las de todos los workers."""
+        if not self.registro.compartido:
+            return self.metricas
+        self.flush()
+        return self.leer(self.registro)[0]
+
+    @staticmethod
+    def _aplicar(metricas: Dict, evento: Dict):
+        tipo = evento["e"]
+        if tipo == "inicio":
+            personaje = evento["p"]
+            metricas["partidas_totales"] += 1
+            metricas["personajes_usados"][personaje] = metricas["personajes_usados"].get(personaje, 0) + 1
+        elif tipo == "pregunta":
+            clave = evento["k"]
+            metricas["preguntas_totales"] += 1
+            metricas["preguntas_frecuentes"].anadir(clave)
+        elif tipo == "resultado":
+            personaje = evento["p"]
+            ganado = evento["g"]
+            metricas["partidas_ganadas" if ganado else "partidas_perdidas"] += 1
+            tasa = metricas["tasa_exito_por_personaje"].setdefault(personaje, {"ganadas": 0, "perdidas": 0})
+            tasa["ganadas" if ganado else "perdidas"] += 1
+        elif tipo == "hueco":
+            categoria = evento["c"]
+            metricas["huecos_por_categoria"][categoria] = metricas["huecos_por_categoria"].get(categoria, 0) + 1
+        elif tipo == "error":
+            metricas["errores"].append({
+                "timestamp": evento["t"],
+                "error": evento["m"],
+                "contexto": evento["x"]
+            })
+            if len(metricas["errores"]) > 100:
+                metricas["errores"] = metricas["errores"][-100:]
+
+    def _registrar(self, evento: Dict):
+        """
+        Aplica el evento en memoria y deja la línea para el trabajador de
+        persistencia; nunca escribe en disco. Con el registro local, una
+        línea descartada por estar lleno la recupera el siguiente snapshot.
+        """
+        admitida = persistencia.admitir('metricas', lambda: len(self._pendientes), self._persistir)
+        with self._lock:
+            self._secuencia += 1
+            self._con_eventos = True
+            evento["n"] = self._secuencia
+            self._aplicar(self.metricas, evento)
+            if admitida:
+                self._pendientes.append(json.dumps(evento, ensure_ascii=False, separators=(',', ':')) + '\n')
+            lleno = len(self._pendientes) >= METRICAS_FLUSH_EVENTOS
+        if lleno:
+            persistencia.enviar(self._persistir, 'metricas')
+
+    def flush(self):
+        with self._io_lock:
+            with self._lock:
+                lineas, self._pendientes = self._pendientes, []
+            if not lineas:
+                return
             try:
-                with open(METRICAS_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                pass
-        return {
-            "partidas_totales": 0,
-            "partidas_ganadas": 0,
-            "partidas_perdidas": 0,
-            "preguntas_totales": 0,
-            "personajes_usados": {},
-            "preguntas_frecuentes": {},
-            "huecos_por_categoria": {},
-            "tasa_exito_por_personaje": {},
-            "errores": []
-        }
+                with telemetria.fase('persistencia_metricas'):
+                    self.registro.anexar(lineas)
+                self._desde_compactacion += len(lineas)
+            except Exception as e:
+                print(f"Error guardando métricas: {e}")
 
     def guardar_metricas(self):
-        try:
-            with open(METRICAS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.metricas, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Error guardando métricas: {e}")
+        """Vuelca los eventos pendientes y compacta todo en el snapshot."""
+        with self._io_lock:
+            with self._lock:
+                lineas, self._pendientes = self._pendientes, []
+                contenido = None
+                if not self.registro.compartido:
+                    contenido = json.dumps(self.instantanea(self.metricas, self._secuencia), ensure_ascii=False, indent=2)
+            try:
+                with telemetria.fase('persistencia_metricas'):
+                    if lineas:
+                        self.registro.anexar(lineas)
+                    self.registro.compactar(contenido)
+                self._desde_compactacion = 0
+            except Exception as e:
+                print(f"Error guardando métricas: {e}")
+
+    def _persistir(self):
+        """Tarea del trabajador de persistencia: vuelca el log y compacta cuando toca."""
+        self.flush()
+        if self._desde_compactacion >= METRICAS_COMPACTAR_EVENTOS:
+            self.guardar_metricas()
+
+    def cerrar(self):
+        """Al salir solo compacta si este proceso registró algo: no pisa el log de otro escritor."""
+        persistencia.cancelar(self._persistir)
+        if self._con_eventos:
+            self.guardar_metricas()
 
     def registrar_partida_iniciada(self, personaje: str):
-        self.metricas["partidas_totales"] += 1
-        if personaje not in self.metricas["personajes_usados"]:
-            self.metricas["personajes_usados"][personaje] = 0
-        self.metricas["personajes_usados"][personaje] += 1
-        self.guardar_metricas()
+        self._registrar({"e": "inicio", "p": personaje})
 
     def registrar_pregunta(self, pregunta: str):
-        self.metricas["preguntas_totales"] += 1
-        pregunta_key = pregunta.lower()[:100]
-        if pregunta_key not in self.metricas["preguntas_frecuentes"]:
-            self.metricas["preguntas_frecuentes"][pregunta_key] = 0
-        self.metricas["preguntas_frecuentes"][pregunta_key] += 1
-        self.guardar_metricas()
+        self._registrar({"e": "pregunta", "k": pregunta.lower()[:100]})
 
     def registrar_resultado(self, personaje: str, ganado: bool):
-        if ganado:
-            self.metricas["partidas_ganadas"] += 1
-        else:
-            self.metricas["partidas_perdidas"] += 1
-        if personaje not in self.metricas["tasa_exito_por_personaje"]:
-            self.metricas["tasa_exito_por_personaje"][personaje] = {"ganadas": 0, "perdidas": 0}
-        if ganado:
-            self.metricas["tasa_exito_por_personaje"][personaje]["ganadas"] += 1
-        else:
-            self.metricas["tasa_exito_por_personaje"][personaje]["perdidas"] += 1
-        self.guardar_metricas()
+        self._registrar({"e": "resultado", "p": personaje, "g": ganado})
 
     def registrar_hueco_categoria(self, categoria: str):
-        if categoria not in self.metricas["huecos_por_categoria"]:
-            self.metricas["huecos_por_categoria"][categoria] = 0
-        self.metricas["huecos_por_categoria"][categoria] += 1
-        self.guardar_metricas()
+        self._registrar({"e": "hueco", "c": categoria})
 
     def registrar_error(self, error: str, contexto: str = ""):
-        self.metricas["errores"].append({
-            "timestamp": datetime.now().isoformat(),
-            "error": error,
-            "contexto": contexto
-        })
-        if len(self.metricas["errores"]) > 100:
-            self.metricas["errores"] = self.metricas["errores"][-100:]
-        self.guardar_metricas()
+        self._registrar({"e": "error", "t": datetime.now().isoformat(), "m": error, "x": contexto})
 
     def obtener_estadisticas(self) -> Dict:
-        total = self.metricas["partidas_totales"]
-        ganadas = self.metricas["partidas_ganadas"]
+        metricas = self.vista()
+        total = metricas["partidas_totales"]
+        ganadas = metricas["partidas_ganadas"]
+        frecuentes = metricas["preguntas_frecuentes"]
         return {
             "partidas_totales": total,
             "partidas_ganadas": ganadas,
-            "partidas_perdidas": self.metricas["partidas_perdidas"],
+            "partidas_perdidas": metricas["partidas_perdidas"],
             "tasa_victoria": round(ganadas / total * 100, 2) if total > 0 else 0,
-            "preguntas_totales": self.metricas["preguntas_totales"],
-            "promedio_preguntas": round(self.metricas["preguntas_totales"] / total, 2) if total > 0 else 0,
+            "preguntas_totales": metricas["preguntas_totales"],
+            "promedio_preguntas": round(metricas["preguntas_totales"] / total, 2) if total > 0 else 0,
             "personajes_mas_usados": sorted(
-                self.metricas["personajes_usados"].items(),
+                metricas["personajes_usados"].items(),
                 key=lambda x: x[1],
                 reverse=True
             )[:10],
             "personajes_menos_usados": sorted(
-                self.metricas["personajes_usados"].items(),
+                metricas["personajes_usados"].items(),
                 key=lambda x: x[1]
             )[:10],
-            "total_errores": len(self.metricas["errores"]),
-            "huecos_por_categoria": self.metricas["huecos_por_categoria"]
+            "total_errores": len(metricas["errores"]),
+            "huecos_por_categoria": metricas["huecos_por_categoria"],
+            "preguntas_frecuentes": frecuentes.top(PREGUNTAS_FRECUENTES_TOP),
+            "preguntas_seguimiento": {
+                "distintas_seguidas": len(frecuentes),
+                "capacidad": frecuentes.capacidad,
+                "error_maximo": frecuentes.minima()
+            }
         }
 
-metricas_manager = MetricasManager()
+def crear_registro_metricas():
+    return RegistroMetricasSQLite() if ALMACEN == 'sqlite' else RegistroMetricas()
+
+
+def metricas_guardadas() -> Dict:
+    """Solo lectura de lo que hay persistido, sin crear el gestor (para la CLI)."""
+    return MetricasManager.leer(crear_registro_metricas())[0]
+
+
+class MetricasDiferidas:
+    """
+    El MetricasManager real se crea con el primer uso (la primera partida o
+    consulta del dashboard), no al importar el módulo: los subcomandos de la
+    CLI no lo llegan a crear, así que no leen, reescriben ni truncan las
+    métricas de un servidor que esté corriendo en el mismo directorio.
+    """
+
+    def __init__(self, fabrica: Callable[[], MetricasManager]):
+        self._fabrica = fabrica
+        self._gestor: Optional[MetricasManager] = None
+        self._lock = threading.Lock()
+
+    def gestor(self) -> MetricasManager:
+        if self._gestor is None:
+            with self._lock:
+                if self._gestor is None:
+                    self._gestor = self._fabrica()
+        return self._gestor
+
+    def __getattr__(self, nombre: str):
+        return getattr(self.gestor(), nombre)
+
+
+metricas_manager = MetricasDiferidas(lambda: MetricasManager(crear_registro_metricas()))
 
 
 # ===================================================================
@@ -212,8 +1012,41 @@ class Normalizador:
         'imaginario': 'ficticio'
     }
 
+    SIGNOS = '¿?¡!.,;:()[]{}"\'-'
+
+    @staticmethod
+    def _tabla() -> Dict[int, Optional[str]]:
+        """
+        Tabla de str.translate que hace en un paso lo mismo que NFD + quitar
+        marcas (Mn) + cambiar signos por espacios, para Latin-1 y Latin
+        Extendido. Lo que quede fuera se resuelve con el camino lento.
+        """
+        tabla = {}
+        for codigo in range(0x80, 0x250):
+            caracter = chr(codigo)
+            plegado = ''.join(c for c in unicodedata.normalize('NFD', caracter) if unicodedata.category(c) != 'Mn')
+            if plegado != caracter:
+                tabla[codigo] = plegado
+        for codigo in range(0x300, 0x370):
+            tabla[codigo] = None
+        for signo in Normalizador.SIGNOS:
+            tabla[ord(signo)] = ' '
+        return tabla
+
+    @staticmethod
+    def _normalizar(texto: str) -> str:
+        if not texto:
+            return ""
+        texto = texto.lower().translate(Normalizador.TABLA)
+        if not texto.isascii():
+            # Fuera de la tabla: NFD puede producir signos nuevos (p. ej. U+037E -> ';')
+            texto = ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+            texto = texto.translate(Normalizador.TABLA)
+        sinonimos = Normalizador.SINONIMOS
+        return ' '.join([sinonimos.get(p, p) for p in texto.split()])
+
     @staticmethod
-    def normalizar(texto: str) -> str:
+    def _normalizar_legacy(texto: str) -> str:
         if not texto:
             return ""
         texto = texto.lower()
@@ -228,27 +1061,143 @@ class Normalizador:
         return ' '.join(palabras_procesadas)
 
 
+Normalizador.TABLA = Normalizador._tabla()
+Normalizador.normalizar = staticmethod(lru_cache(maxsize=NORMALIZADOR_CACHE)(Normalizador._normalizar))
+
+
 # ===================================================================
 # REGISTRO DE HUECOS
 # ===================================================================
 
+class RegistroHuecos:
+    """
+    Log de huecos en JSON lines. registrar() solo toca memoria: añade la
+    entrada al anillo de recientes (lo que lee el dashboard) y deja la línea
+    al trabajador de persistencia, que vuelca por lotes y rota por tamaño.
+    Los contadores por pregunta y por personaje cubren la misma ventana que el
+    anillo y se actualizan al entrar y salir cada hueco.
+    """
+
+    def __init__(self, archivo: str = REGISTRO_HUECOS_FILE, rotar_bytes: int = HUECOS_ROTAR_BYTES,
+                 en_memoria: int = HUECOS_EN_MEMORIA):
+        self.archivo = archivo
+        self.rotar_bytes = rotar_bytes
+        self.recientes: deque = deque(maxlen=en_memoria)
+        self.por_pregunta: Counter = Counter()
+        self.por_personaje: Counter = Counter()
+        self._version = 0
+        self._tops: Dict[Tuple[str, int], Tuple[int, List]] = {}
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._pendientes: List[str] = []
+        self._cargar_recientes()
+        atexit.register(self.flush)
+
+    def _cargar_recientes(self):
+        """Solo al arrancar: últimos huecos del log (o del antiguo JSON, que se migra una vez)."""
+        archivos = [a for a in (self.archivo + '.1', self.archivo) if os.path.exists(a)]
+        if archivos:
+            # Tras una rotación puede existir solo el .1: también cuenta como log
+            for archivo in archivos:
+                with open(archivo, 'r', encoding='utf-8') as f:
+                    for linea in f:
+                        try:
+                            self._anadir(json.loads(linea))
+                        except ValueError:
+                            continue
+        elif os.path.exists(REGISTRO_HUECOS_LEGACY_FILE):
+            try:
+                with open(REGISTRO_HUECOS_LEGACY_FILE, 'r', encoding='utf-8') as f:
+                    antiguos = json.load(f)
+                for hueco in antiguos:
+                    self._anadir(hueco)
+                self._escribir([json.dumps(h, ensure_ascii=False) + '\n' for h in antiguos])
+                # Renombrado para no volver a migrarlo (y pisar el .1) en el siguiente arranque
+                os.replace(REGISTRO_HUECOS_LEGACY_FILE, REGISTRO_HUECOS_LEGACY_FILE + '.migrado')
+                print(f"📦 {len(antiguos)} huecos migrados a {self.archivo}")
+            except Exception as e:
+                print(f"⚠️ No se pudo migrar {REGISTRO_HUECOS_LEGACY_FILE}: {e}")
+
+    def _anadir(self, entrada: Dict):
+        if len(self.recientes) == self.recientes.maxlen:
+            saliente = self.recientes[0]
+            for contador, clave in ((self.por_pregunta, saliente.get('pregunta_normalizada')),
+                                    (self.por_personaje, saliente.get('personaje'))):
+                contador[clave] -= 1
+                if contador[clave] <= 0:
+                    del contador[clave]
+        self.recientes.append(entrada)
+        self.por_pregunta[entrada.get('pregunta_normalizada')] += 1
+        self.por_personaje[entrada.get('personaje')] += 1
+        self._version += 1
+
+    def registrar(self, entrada: Dict):
+        linea = json.dumps(entrada, ensure_ascii=False) + '\n'
+        admitida = persistencia.admitir('huecos', lambda: len(self._pendientes), self.flush)
+        with self._lock:
+            self._anadir(entrada)
+            if admitida:
+                self._pendientes.append(linea)
+        if admitida:
+            persistencia.enviar(self.flush, 'huecos')
+
+    def ultimos(self, limite: Optional[int] = None) -> List[Dict]:
+        """Los últimos huecos en orden cronológico."""
+        with self._lock:
+            if limite is None:
+                return list(self.recientes)
+            return list(islice(reversed(self.recientes), limite))[::-1]
+
+    def total(self) -> int:
+        return len(self.recientes)
+
+    def top_preguntas(self, n: int) -> List[Tuple[str, int]]:
+        return self._top('pregunta', self.por_pregunta, n)
+
+    def top_personajes(self, n: int) -> List[Tuple[str, int]]:
+        return self._top('personaje', self.por_personaje, n)
+
+    def _top(self, nombre: str, contador: Counter, n: int) -> List[Tuple[str, int]]:
+        # Top-k con heap, recalculado solo si ha entrado algún hueco desde la última vez
+        with self._lock:
+            version, resultado = self._tops.get((nombre, n), (-1, []))
+            if version != self._version:
+                resultado = heapq.nlargest(n, contador.items(), key=itemgetter(1))
+                self._tops[(nombre, n)] = (self._version, resultado)
+            return resultado
+
+    def _escribir(self, lineas: List[str]):
+        with telemetria.fase('persistencia_huecos'):
+            with open(self.archivo, 'a', encoding='utf-8') as f:
+                f.write(''.join(lineas))
+                tamano = f.tell()
+            if tamano >= self.rotar_bytes:
+                os.replace(self.archivo, self.archivo + '.1')
+
+    def flush(self):
+        """Escribe las líneas pendientes; lo llama el trabajador de persistencia (y atexit)."""
+        with self._io_lock:
+            with self._lock:
+                lineas, self._pendientes = self._pendientes, []
+            if not lineas:
+                return
+            try:
+                self._escribir(lineas)
+            except Exception as e:
+                print(f"⚠️ Error escribiendo huecos: {e}")
+
+
+registro_huecos = RegistroHuecos()
+
+
 def registrar_hueco(pregunta: str, personaje: Dict, pregunta_norm: str):
     try:
-        if os.path.exists(REGISTRO_HUECOS_FILE):
-            with open(REGISTRO_HUECOS_FILE, 'r', encoding='utf-8') as f:
-                registros = json.load(f)
-        else:
-            registros = []
-        registros.append({
+        registro_huecos.registrar({
             "timestamp": datetime.now().isoformat(),
             "pregunta_original": pregunta,
             "pregunta_normalizada": pregunta_norm,
             "personaje": personaje.get("nombre", "desconocido")
         })
-        if len(registros) > 1000:
-            registros = registros[-1000:]
-        with open(REGISTRO_HUECOS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(registros, f, ensure_ascii=False, indent=2)
         metricas_manager.registrar_hueco_categoria("pregunta_no_clasificable")
         print(f"📝 Hueco registrado: '{pregunta}' para {personaje.get('nombre')}")
     except Exception as e:
@@ -257,66 +1206,694 @@ def registrar_hueco(pregunta: str, personaje: Dict, pregunta_norm: str):
 
 
 # ===================================================================
-# ANALIZADOR DE PREGUNTAS (VERSIÓN HÍBRIDA)
+# TABLA DE REGLAS DEL ANALIZADOR
 # ===================================================================
+# Cada regla: términos disparadores -> rutas de atributos -> predicado.
+# El orden de la tabla es la prioridad: gana la primera regla que casa,
+# igual que en la cadena de ifs original (_resolver_legacy).
 
-class AnalizadorPreguntas:
-    @staticmethod
-    def analizar(pregunta: str, personaje: Dict) -> Dict:
-        pregunta_norm = Normalizador.normalizar(pregunta)
+def _valor(personaje: Dict, ruta: str, defecto=None):
+    partes = ruta.split('.')
+    actual = personaje
+    for parte in partes[:-1]:
+        actual = actual.get(parte, {})
+    return actual.get(partes[-1], defecto)
 
-        # ---------- TIPO ----------
-        if 'real' in pregunta_norm or 'existio' in pregunta_norm or 'carne y hueso' in pregunta_norm:
-            es_real = personaje.get('tipo') == 'real'
-            return {'answer': 'Sí' if es_real else 'No', 'clarification': ''}
-        if 'ficticio' in pregunta_norm or 'inventado' in pregunta_norm or 'imaginario' in pregunta_norm:
-            es_ficticio = personaje.get('tipo') == 'ficticio'
-            return {'answer': 'Sí' if es_ficticio else 'No', 'clarification': ''}
 
-        # ---------- GÉNERO ----------
-        if 'masculino' in pregunta_norm or 'hombre' in pregunta_norm:
-            es_hombre = personaje.get('genero') == 'masculino'
-            return {'answer': 'Sí' if es_hombre else 'No', 'clarification': ''}
-        if 'femenino' in pregunta_norm or 'mujer' in pregunta_norm or 'dama' in pregunta_norm:
-            es_mujer = personaje.get('genero') == 'femenino'
-            return {'answer': 'Sí' if es_mujer else 'No', 'clarification': ''}
+def _tiene_ruta(personaje: Dict, ruta: str) -> bool:
+    actual = personaje
+    for parte in ruta.split('.'):
+        if not isinstance(actual, dict) or parte not in actual:
+            return False
+        actual = actual[parte]
+    return True
 
-        # ---------- VITAL ----------
-        if 'vivo' in pregunta_norm or 'vive' in pregunta_norm:
-            vivo = personaje.get('vivo', False)
-            return {'answer': 'Sí' if vivo else 'No', 'clarification': ''}
-        if 'muerto' in pregunta_norm or 'murio' in pregunta_norm or 'fallecido' in pregunta_norm:
-            muerto = not personaje.get('vivo', True)
-            return {'answer': 'Sí' if muerto else 'No', 'clarification': ''}
 
-        # ---------- FAMA ----------
-        if 'famoso' in pregunta_norm or 'conocido' in pregunta_norm or 'celebre' in pregunta_norm:
-            famoso = personaje.get('famoso', False)
-            return {'answer': 'Sí' if famoso else 'No', 'clarification': ''}
-        if 'todo el mundo' in pregunta_norm or 'todo mundo' in pregunta_norm:
-            conocido = personaje.get('famoso', False)
-            return {'answer': 'Sí' if conocido else 'No', 'clarification': ''}
+class Predicado:
+    """
+    Hecho booleano sobre un personaje; 'campos' son las rutas que consulta y
+    'firma' describe el predicado con sus parámetros (entra en firma_roster).
+    """
+    __slots__ = ('campos', 'evaluar', 'faltantes', 'firma')
 
-        # ---------- RIQUEZA ----------
-        if 'rico' in pregunta_norm or 'millonario' in pregunta_norm or 'adinerado' in pregunta_norm:
-            rico = personaje.get('rico', False)
-            return {'answer': 'Sí' if rico else 'No', 'clarification': ''}
-        if 'pobre' in pregunta_norm:
-            pobre = personaje.get('pobre', False)
-            return {'answer': 'Sí' if pobre else 'No', 'clarification': ''}
+    def __init__(self, campos: Tuple[str, ...], evaluar, faltantes=None, firma: Tuple = ()):
+        self.campos = campos
+        self.evaluar = evaluar
+        self.firma = firma
+        self.faltantes = faltantes or (lambda p: [c for c in campos if not _tiene_ruta(p, c)])
 
-        # ---------- PROFESIÓN ----------
-        if 'cientifico' in pregunta_norm:
-            es_cientifico = personaje.get('profesion') in ['cientifico', 'cientifica'] or personaje.get('area') in ['fisica', 'quimica']
-            return {'answer': 'Sí' if es_cientifico else 'No', 'clarification': ''}
-        if 'artista' in pregunta_norm or 'pintor' in pregunta_norm:
-            es_artista = personaje.get('profesion') == 'artista' or personaje.get('area') == 'arte'
-            return {'answer': 'Sí' if es_artista else 'No', 'clarification': ''}
-        if 'escritor' in pregunta_norm or 'autor' in pregunta_norm:
-            es_escritor = personaje.get('profesion') == 'escritor' or personaje.get('area') == 'literatura'
-            return {'answer': 'Sí' if es_escritor else 'No', 'clarification': ''}
-        if 'militar' in pregunta_norm or 'soldado' in pregunta_norm or 'guerrero' in pregunta_norm:
-            es_militar = personaje.get('profesion') in ['militar', 'guerrera'] or personaje.get('area') == 'guerra'
+    def __call__(self, personaje: Dict) -> bool:
+        return bool(self.evaluar(personaje))
+
+
+def _igual(ruta: str, valor) -> Predicado:
+    return Predicado((ruta,), lambda p: _valor(p, ruta) == valor, firma=('igual', ruta, valor))
+
+def _en(ruta: str, valores: List) -> Predicado:
+    return Predicado((ruta,), lambda p: _valor(p, ruta) in valores, firma=('en', ruta, list(valores)))
+
+def _bandera(ruta: str) -> Predicado:
+    return Predicado((ruta,), lambda p: _valor(p, ruta, False), firma=('bandera', ruta))
+
+def _negada(ruta: str) -> Predicado:
+    return Predicado((ruta,), lambda p: not _valor(p, ruta, True), firma=('negada', ruta))
+
+def _texto_contiene(ruta: str, texto: str) -> Predicado:
+    return Predicado((ruta,), lambda p: texto in _valor(p, ruta, ''), firma=('texto_contiene', ruta, texto))
+
+def _lista_menciona(ruta: str, texto: str) -> Predicado:
+    return Predicado((ruta,), lambda p: any(texto in str(x).lower() for x in _valor(p, ruta, [])),
+                     firma=('lista_menciona', ruta, texto))
+
+def _lista_no_vacia(ruta: str) -> Predicado:
+    return Predicado((ruta,), lambda p: len(_valor(p, ruta, [])) > 0, firma=('lista_no_vacia', ruta))
+
+def _alguno(*predicados: Predicado) -> Predicado:
+    # Basta con que exista una de las alternativas para poder responder
+    def faltantes(p):
+        listas = [pred.faltantes(p) for pred in predicados]
+        return [c for faltan in listas for c in faltan] if all(listas) else []
+    campos = tuple(c for pred in predicados for c in pred.campos)
+    return Predicado(campos, lambda p: any(pred(p) for pred in predicados), faltantes,
+                     firma=('alguno',) + tuple(pred.firma for pred in predicados))
+
+def _todos(*predicados: Predicado) -> Predicado:
+    campos = tuple(c for pred in predicados for c in pred.campos)
+    return Predicado(campos, lambda p: all(pred(p) for pred in predicados),
+                     firma=('todos',) + tuple(pred.firma for pred in predicados))
+
+
+def _responder_siglo(pregunta_norm: str, vector: 'VectorRespuestas') -> Optional[Dict]:
+    siglo_inicio = vector.siglo_inicio
+    siglo_fin = vector.siglo_fin
+    match = re.search(r'siglo\s+(\d+)', pregunta_norm)
+    if match:
+        siglo_preg = int(match.group(1))
+        return {'answer': 'Sí' if siglo_inicio <= siglo_preg <= siglo_fin else 'No', 'clarification': ''}
+    if siglo_inicio > 0:
+        return {'answer': f'Sí, siglo {siglo_inicio}' if siglo_inicio == siglo_fin else f'Siglos {siglo_inicio} al {siglo_fin}', 'clarification': ''}
+    # Sin número ni datos: la pregunta sigue bajando por la tabla
+    return None
+
+
+class Regla:
+    """
+    'grupos' son alternativas de términos que deben aparecer TODAS (un término
+    de cada grupo); 'excluye' son términos que anulan la regla. Las reglas con
+    'responder' construyen la respuesta ellas mismas y pueden devolver None.
+    'bit' es la posición del hecho en los VectorRespuestas (la asigna el motor).
+    """
+    __slots__ = ('id', 'grupos', 'excluye', 'hecho', 'responder', 'campos', 'bit')
+
+    def __init__(self, id: str, disparadores: Tuple[str, ...], hecho: Optional[Predicado] = None,
+                 requiere: Tuple[Tuple[str, ...], ...] = (), excluye: Tuple[str, ...] = (),
+                 responder=None, campos: Tuple[str, ...] = ()):
+        self.id = id
+        self.grupos = (tuple(disparadores),) + tuple(requiere)
+        self.excluye = tuple(excluye)
+        self.hecho = hecho
+        self.responder = responder
+        self.campos = hecho.campos if hecho else tuple(campos)
+        self.bit = None
+
+    def faltantes(self, personaje: Dict) -> List[str]:
+        if self.hecho:
+            return self.hecho.faltantes(personaje)
+        return [c for c in self.campos if not _tiene_ruta(personaje, c)]
+
+
+REGLAS = [
+    # ---------- TIPO ----------
+    Regla('tipo_real', ('real', 'existio', 'carne y hueso'), _igual('tipo', 'real')),
+    Regla('tipo_ficticio', ('ficticio', 'inventado', 'imaginario'), _igual('tipo', 'ficticio')),
+
+    # ---------- GÉNERO ----------
+    Regla('genero_masculino', ('masculino', 'hombre'), _igual('genero', 'masculino')),
+    Regla('genero_femenino', ('femenino', 'mujer', 'dama'), _igual('genero', 'femenino')),
+
+    # ---------- VITAL ----------
+    Regla('vivo', ('vivo', 'vive'), _bandera('vivo')),
+    Regla('muerto', ('muerto', 'murio', 'fallecido'), _negada('vivo')),
+
+    # ---------- FAMA ----------
+    Regla('famoso', ('famoso', 'conocido', 'celebre'), _bandera('famoso')),
+    Regla('conocido_mundial', ('todo el mundo', 'todo mundo'), _bandera('famoso')),
+
+    # ---------- RIQUEZA ----------
+    Regla('rico', ('rico', 'millonario', 'adinerado'), _bandera('rico')),
+    Regla('pobre', ('pobre',), _bandera('pobre')),
+
+    # ---------- PROFESIÓN ----------
+    Regla('cientifico', ('cientifico',),
+          _alguno(_en('profesion', ['cientifico', 'cientifica']), _en('area', ['fisica', 'quimica']))),
+    Regla('artista', ('artista', 'pintor'), _alguno(_igual('profesion', 'artista'), _igual('area', 'arte'))),
+    Regla('escritor', ('escritor', 'autor'), _alguno(_igual('profesion', 'escritor'), _igual('area', 'literatura'))),
+    Regla('militar', ('militar', 'soldado', 'guerrero'),
+          _alguno(_en('profesion', ['militar', 'guerrera']), _igual('area', 'guerra'))),
+    Regla('mago', ('mago', 'bruja'), _alguno(_en('profesion', ['mago', 'bruja']), _igual('area', 'magia'))),
+    Regla('superheroe', ('superheroe', 'heroe'), _igual('profesion', 'superheroe')),
+    Regla('villano', ('villano', 'malo'), _igual('profesion', 'villano')),
+    Regla('detective', ('detective',), _igual('profesion', 'detective')),
+    Regla('dramaturgo', ('dramaturgo',), _todos(_igual('profesion', 'escritor'), _texto_contiene('area', 'teatro'))),
+    Regla('inventor', ('inventor',), _bandera('rol.es_inventor')),
+    Regla('presidente', ('presidente',), _lista_menciona('caracteristicas', 'presidente')),
+    Regla('escultor', ('escultor',), _igual('profesion', 'escultor')),
+
+    # ---------- NACIONALIDAD ----------
+    Regla('europa', ('europa', 'europeo'),
+          _en('nacionalidad', ['aleman', 'frances', 'ingles', 'italiano', 'espanol', 'polaca', 'francesa', 'inglesa'])),
+    Regla('america', ('america', 'americano'), _en('nacionalidad', ['americano', 'estadounidense', 'mexicana'])),
+    Regla('asia', ('asia', 'asiatico'), _en('nacionalidad', ['chino', 'japones', 'indio'])),
+    Regla('aleman', ('aleman',), _igual('nacionalidad', 'aleman')),
+    Regla('frances', ('frances',), _igual('nacionalidad', 'frances')),
+    Regla('ingles', ('ingles', 'britanico'), _igual('nacionalidad', 'ingles')),
+    Regla('italiano', ('italiano',), _igual('nacionalidad', 'italiano')),
+    Regla('espanol', ('espanol',), _igual('nacionalidad', 'espanol')),
+    Regla('polaco', ('polaco',), _igual('nacionalidad', 'polaca')),
+    Regla('chino', ('chino',), _igual('nacionalidad', 'china')),
+    Regla('mexicano', ('mexicano',), _igual('nacionalidad', 'mexicana')),
+    Regla('estadounidense', ('estadounidense', 'usa'), _igual('nacionalidad', 'americano')),
+
+    # ---------- ÉPOCA ----------
+    Regla('epoca_antigua', ('antigua', 'antiguedad'),
+          _alguno(_igual('epoca', 'antigua'), _bandera('periodo.vivio_antiguedad'))),
+    Regla('epoca_medieval', ('medieval', 'edad media'),
+          _alguno(_igual('epoca', 'medieval'), _bandera('periodo.es_medieval'))),
+    Regla('epoca_renacimiento', ('renacimiento',), _igual('epoca', 'renacimiento')),
+    Regla('epoca_moderna', ('moderna', 'moderno'), _en('epoca', ['moderna', 'contemporaneo', 'victoriana'])),
+    Regla('epoca_futuro', ('futuro', 'futurista'), _igual('epoca', 'futuro')),
+
+    # ---------- SIGLO ----------
+    Regla('siglo', ('siglo',), responder=_responder_siglo,
+          campos=('periodo.siglo_inicio', 'periodo.siglo_fin')),
+    Regla('antes_de_cristo', ('antes de cristo', 'antes cristo'), _bandera('periodo.antes_de_cristo')),
+
+    # ---------- UNIVERSO ----------
+    Regla('universo_dc', ('dc',), _igual('universo', 'DC')),
+    Regla('universo_marvel', ('marvel',), _igual('universo', 'Marvel')),
+    Regla('universo_harry_potter', ('harry potter',), _igual('universo', 'Harry Potter')),
+    Regla('universo_star_wars', ('star wars',), _igual('universo', 'Star Wars')),
+    Regla('universo_tolkien', ('senor de los anillos',), _igual('universo', 'Tolkien')),
+
+    # ---------- CARACTERÍSTICAS FÍSICAS ----------
+    Regla('gafas', ('gafas', 'lentes'), _lista_menciona('caracteristicas', 'gafas')),
+    Regla('barba', ('barba',), _lista_menciona('caracteristicas', 'barba')),
+    Regla('calvo', ('calvo',), _bandera('fisico.es_calvo')),
+    Regla('alto', ('alto',), _bandera('fisico.alto')),
+    Regla('bajo', ('bajo',), _bandera('fisico.bajo')),
+
+    # ---------- PODERES / HABILIDADES ----------
+    Regla('poderes', ('poderes', 'superpoderes'), _bandera('tiene_poderes')),
+    Regla('vuela', ('volar', 'vuela'), _alguno(_bandera('habilidades.vuela'), _bandera('puede_volar'))),
+    Regla('inmortal', ('inmortal', 'vivir para siempre'),
+          _alguno(_bandera('habilidades.es_inmortal'), _bandera('es_inmortal'))),
+    Regla('fuerza_sobrehumana', ('fuerza sobrehumana',), _bandera('habilidades.fuerza_sobrehumana')),
+    Regla('habilidades_especiales', ('habilidades especiales',), _bandera('habilidades.tiene_habilidades_especiales')),
+
+    # ---------- ARMAS / OBJETOS ----------
+    Regla('arco', ('arco',), _bandera('armas_objetos.tiene_arco')),
+    Regla('espada', ('espada',), _bandera('armas_objetos.usa_espada')),
+    Regla('porta_armas', ('arma',), _bandera('armas_objetos.porta_armas'), requiere=(('porta', 'usa'),)),
+    Regla('gadgets', ('gadgets',), _bandera('armas_objetos.tiene_gadgets')),
+    Regla('tecnologia_avanzada', ('tecnologia',), _bandera('armas_objetos.usa_tecnologia_avanzada'),
+          requiere=(('avanzada',),)),
+
+    # ---------- LOGROS / IMPACTO ----------
+    Regla('nobel', ('premio nobel', 'nobel'), _lista_menciona('impacto.premios', 'nobel')),
+    Regla('premios', ('premio',), _lista_no_vacia('impacto.premios'), excluye=('nobel',)),
+    Regla('revoluciono', ('revolucion', 'revoluciono'), _bandera('impacto.revoluciono_campo')),
+    Regla('cambio_historia', ('cambio',), _bandera('impacto.cambio_historia'), requiere=(('historia',),)),
+    Regla('descubrimientos', ('descubrimiento', 'hizo descubrimientos'), _bandera('impacto.hizo_descubrimientos')),
+
+    # ---------- PERFIL MORAL ----------
+    Regla('violento', ('violento', 'violencia'), _bandera('perfil_moral.violento')),
+    Regla('pacifista', ('pacifista', 'paz'), _bandera('perfil_moral.pacifista')),
+    Regla('conquistador', ('conquistador', 'conquisto'), _bandera('perfil_moral.conquistador')),
+    Regla('imperialista', ('imperialista', 'imperio'), _bandera('perfil_moral.imperialista')),
+    Regla('lucho_libertad', ('lucho',), _bandera('perfil_moral.lucho_libertad'), requiere=(('libertad',),)),
+
+    # ---------- ROL ----------
+    Regla('lider', ('lider',), _bandera('rol.lider')),
+    Regla('gobernante', ('gobernante', 'goberno'), _bandera('rol.gobernante')),
+    Regla('general', ('general',), _bandera('rol.general')),
+    Regla('antagonista', ('antagonista',), _bandera('rol.antagonista')),
+
+    # ---------- IDEOLOGÍA ----------
+    Regla('liberal', ('liberal',), _bandera('ideologia.liberal')),
+    Regla('conservador', ('conservador',), _bandera('ideologia.conservador')),
+
+    # ---------- ICÓNICO ----------
+    Regla('iconico', ('iconico', 'figura iconica'), _bandera('impacto.iconico')),
+]
+
+
+class MotorReglas:
+    """
+    Compila la tabla de reglas en un índice término -> reglas.
+    Los términos de una palabra se buscan token a token (con caché por token,
+    así que cada palabra distinta se escanea una sola vez) y las frases con
+    espacios contra la pregunta completa. Las reglas que casan no dependen del
+    personaje, así que se cachean por pregunta normalizada: una pregunta
+    repetida solo paga la evaluación de su primera regla.
+    """
+
+    def __init__(self, reglas: List[Regla], cache_palabras: int = 4096):
+        self.reglas = reglas
+        self.por_id = {regla.id: regla for regla in reglas}
+        self.con_hecho = [regla for regla in reglas if regla.hecho]
+        for bit, regla in enumerate(self.con_hecho):
+            regla.bit = bit
+        terminos = []
+        self._reglas_por_termino: Dict[str, List[int]] = defaultdict(list)
+        for indice, regla in enumerate(reglas):
+            for termino in regla.grupos[0]:
+                self._reglas_por_termino[termino].append(indice)
+            for grupo in regla.grupos + (regla.excluye,):
+                for termino in grupo:
+                    if termino not in terminos:
+                        terminos.append(termino)
+        self._palabras = tuple(t for t in terminos if ' ' not in t)
+        self._frases = tuple(t for t in terminos if ' ' in t)
+        self._terminos_en_palabra = lru_cache(maxsize=cache_palabras)(self._buscar_en_palabra)
+        self.candidatas = lru_cache(maxsize=cache_palabras)(self._candidatas)
+
+    def _buscar_en_palabra(self, palabra: str) -> Tuple[str, ...]:
+        return tuple(t for t in self._palabras if t in palabra)
+
+    def terminos(self, pregunta_norm: str) -> set:
+        # pregunta_norm viene del Normalizador: tokens separados por un espacio,
+        # así que un término sin espacios está en la pregunta sii está en un token
+        encontrados = set()
+        for palabra in set(pregunta_norm.split(' ')):
+            encontrados.update(self._terminos_en_palabra(palabra))
+        for frase in self._frases:
+            if frase in pregunta_norm:
+                encontrados.add(frase)
+        return encontrados
+
+    def _candidatas(self, pregunta_norm: str) -> Tuple[Regla, ...]:
+        """Reglas que casan con la pregunta, en orden de prioridad."""
+        encontrados = self.terminos(pregunta_norm)
+        indices = sorted({i for t in encontrados for i in self._reglas_por_termino.get(t, ())})
+        candidatas = []
+        for indice in indices:
+            regla = self.reglas[indice]
+            if any(t in encontrados for t in regla.excluye):
+                continue
+            if all(any(t in encontrados for t in grupo) for grupo in regla.grupos[1:]):
+                candidatas.append(regla)
+        return tuple(candidatas)
+
+    def compilar(self, personaje: Dict) -> 'VectorRespuestas':
+        bits = 0
+        for regla in self.con_hecho:
+            if regla.hecho(personaje):
+                bits |= 1 << regla.bit
+        periodo = personaje.get('periodo', {})
+        return VectorRespuestas(
+            personaje.get('_id'),
+            personaje.get('nombre'),
+            bits,
+            periodo.get('siglo_inicio', 0),
+            periodo.get('siglo_fin', 0)
+        )
+
+    def regla_binaria(self, pregunta_norm: str) -> Optional[Regla]:
+        """Regla Sí/No que responde la pregunta para cualquier personaje, o None si depende de él."""
+        for regla in self.candidatas(pregunta_norm):
+            return None if regla.responder else regla
+        return None
+
+    def resolver(self, pregunta_norm: str, vector: 'VectorRespuestas') -> Optional[Dict]:
+        for regla in self.candidatas(pregunta_norm):
+            if regla.responder:
+                respuesta = regla.responder(pregunta_norm, vector)
+                if respuesta is None:
+                    continue
+                return respuesta
+            return {'answer': 'Sí' if vector.bits >> regla.bit & 1 else 'No', 'clarification': ''}
+        return None
+
+
+class VectorRespuestas(NamedTuple):
+    """Respuestas precalculadas e inmutables de un personaje: un bit por regla."""
+    id: Optional[int]
+    nombre: Optional[str]
+    bits: int
+    siglo_inicio: int
+    siglo_fin: int
+
+
+# ===================================================================
+# LEMAS Y ERRATAS
+# ===================================================================
+
+class Lematizador:
+    """
+    Lleva al término disparador más cercano las palabras de una pregunta
+    que no disparan ninguna regla: formas flexionadas ("famosa",
+    "escritoras"), raíces de verbos y derivados ("pintaba" -> "pintor") y
+    erratas a distancia 1 ("cientifco"). Todo se precalcula a partir de los
+    términos de la tabla de reglas: por palabra cuesta unas pocas búsquedas
+    en diccionarios (vecindario de borrados para las erratas). Si una forma
+    lleva a términos de reglas distintas ("invento": inventado/inventor) es
+    ambigua y no se cambia.
+    """
+
+    SUFIJOS = tuple(sorted((
+        'aciones', 'acion', 'imientos', 'imiento', 'amente', 'mente', 'ieron', 'aron', 'abamos',
+        'ando', 'iendo', 'aban', 'abas', 'aba', 'ados', 'adas', 'ado', 'ada', 'idos', 'idas', 'ido',
+        'ida', 'adores', 'adoras', 'adora', 'ador', 'istas', 'ista', 'ores', 'oras', 'ora', 'or',
+        'uras', 'ura', 'antes', 'ante', 'ente', 'ian', 'ias', 'ia', 'ar', 'er', 'ir', 'es', 'os',
+        'as', 'o', 'a', 'e', 's'
+    ), key=len, reverse=True))
+
+    # Plural y género: lo único que lleva a un término con raíz de tres letras
+    # (las formas de _formas). Una raíz así con cualquier otro sufijo ya
+    # explica la palabra ("actor", "espia", "bajista") y no se corrige como errata.
+    INFLEXIONES = {'o', 'a', 'os', 'as', 'es', 's', 'e'}
+    RAIZ_MINIMA = 4
+
+    PALABRAS_VACIAS = {
+        'tiene', 'tenia', 'tuvo', 'esta', 'este', 'estaba', 'estuvo', 'como', 'para', 'sobre',
+        'algun', 'alguna', 'alguno', 'algo', 'persona', 'personaje', 'hace', 'hacia', 'hizo',
+        'puede', 'podia', 'cual', 'donde', 'cuando', 'quien', 'otro', 'otra', 'suyo', 'suya',
+        'eres', 'ella', 'ellos', 'entre', 'desde', 'mucho', 'mucha', 'muchos', 'muchas', 'nunca',
+        'siempre', 'tambien', 'todo', 'toda', 'todos', 'todas', 'usaba', 'usar', 'usado'
+    }
+
+    def __init__(self, motor: MotorReglas, longitud_minima: int = 4, errata_minima: int = 5,
+                 cache: int = 4096):
+        self.motor = motor
+        self.borrados: Dict[str, List[str]] = defaultdict(list)
+        self.errata_minima = errata_minima
+        self.reglas_de = defaultdict(set)
+        for regla in motor.reglas:
+            for grupo in regla.grupos:
+                for termino in grupo:
+                    self.reglas_de[termino].add(regla.id)
+        disparadores = set(motor._palabras)
+        formas, raices = defaultdict(list), defaultdict(list)
+        for termino in motor._palabras:
+            if len(termino) < longitud_minima:
+                continue
+            for forma in self._formas(termino):
+                if forma not in disparadores:
+                    formas[forma].append(termino)
+            raiz = self.raiz(termino)
+            # Raíces de tres letras ("esp", "aut", "lid") atrapan palabras que no tienen nada que ver
+            if len(raiz) >= self.RAIZ_MINIMA:
+                raices[raiz].append(termino)
+            if len(termino) >= errata_minima:
+                for borrado in self._borrados(termino):
+                    if termino not in self.borrados[borrado]:
+                        self.borrados[borrado].append(termino)
+        self.formas = {forma: terminos[0] for forma, terminos in formas.items() if self._unico(terminos)}
+        self.raices = {raiz: terminos[0] for raiz, terminos in raices.items() if self._unico(terminos)}
+        for palabra in self.PALABRAS_VACIAS:
+            self.raices.pop(self.raiz(palabra), None)
+        self.lema = lru_cache(maxsize=cache)(self._lema)
+
+    def _unico(self, terminos: List[str]) -> bool:
+        """¿Todos los términos disparan las mismas reglas?"""
+        return all(self.reglas_de[t] == self.reglas_de[terminos[0]] for t in terminos[1:])
+
+    @staticmethod
+    def _formas(termino: str) -> set:
+        """Plurales y femeninos regulares del término."""
+        formas = {termino + 's', termino + 'es'}
+        if termino.endswith('o'):
+            formas |= {termino[:-1] + 'a', termino[:-1] + 'as'}
+        elif termino[-1] not in 'aeiou':
+            formas |= {termino + 'a', termino + 'as'}
+        return formas
+
+    @staticmethod
+    def raiz(palabra: str) -> str:
+        """Quita el sufijo más largo que deje al menos tres letras."""
+        for sufijo in Lematizador.SUFIJOS:
+            if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= 3:
+                return palabra[:-len(sufijo)]
+        return palabra
+
+    @staticmethod
+    def _explicada(palabra: str) -> bool:
+        """
+        ¿Raíz corta + sufijo derivativo o verbal ("act-or", "esp-ia", "baj-ista")?
+        Es una palabra real, no una errata: "actor" no es "autor".
+        """
+        return any(palabra.endswith(sufijo) and 2 <= len(palabra) - len(sufijo) < Lematizador.RAIZ_MINIMA
+                   for sufijo in Lematizador.SUFIJOS if sufijo not in Lematizador.INFLEXIONES)
+
+    @staticmethod
+    def _borrados(palabra: str) -> set:
+        return {palabra[:i] + palabra[i + 1:] for i in range(len(palabra))}
+
+    def _lema(self, palabra: str) -> Optional[str]:
+        if len(palabra) < 4 or palabra in self.PALABRAS_VACIAS:
+            return None
+        termino = self.formas.get(palabra) or self.raices.get(self.raiz(palabra))
+        if termino or len(palabra) < self.errata_minima - 1 or self._explicada(palabra):
+            return termino
+        # Erratas: un borrado de la palabra, o la palabra misma, coincide con un borrado del término
+        candidatos = list(self.borrados.get(palabra, ()))
+        for borrado in self._borrados(palabra):
+            if borrado in self.borrados:
+                candidatos.extend(self.borrados[borrado])
+        cercanos = [c for c in dict.fromkeys(candidatos) if distancia_edicion(palabra, c, 1) <= 1]
+        return cercanos[0] if cercanos and self._unico(cercanos) else None
+
+    def regla_binaria(self, pregunta_norm: str) -> Tuple[str, Optional[Regla]]:
+        """
+        (texto con el que se resuelve, regla Sí/No) con la misma expansión que
+        AnalizadorPreguntas.resolver: a lemas solo si ninguna regla casa tal cual.
+        """
+        regla = self.motor.regla_binaria(pregunta_norm)
+        if regla is None and ANALIZADOR_LEMAS and not self.motor.candidatas(pregunta_norm):
+            texto = self.expandir(pregunta_norm)
+            return texto, self.motor.regla_binaria(texto)
+        return pregunta_norm, regla
+
+    def expandir(self, pregunta_norm: str) -> str:
+        """La pregunta con cada palabra que no dispara nada cambiada por su término, si lo tiene."""
+        palabras = pregunta_norm.split(' ')
+        cambiada = False
+        for i, palabra in enumerate(palabras):
+            if self.motor._terminos_en_palabra(palabra):
+                continue
+            termino = self.lema(palabra)
+            if termino:
+                palabras[i] = termino
+                cambiada = True
+        return ' '.join(palabras) if cambiada else pregunta_norm
+
+
+# ===================================================================
+# CACHÉ DE RESPUESTAS
+# ===================================================================
+
+class CacheRespuestas:
+    """
+    LRU acotada (pregunta normalizada, _id, versión del roster de la
+    partida) -> respuesta.
+    Guarda también los None (preguntas sin clasificar) para que un hueco
+    repetido no vuelva a pasar por el motor; quien consulta sigue
+    registrando el hueco. La versión en la clave hace que un roster recargado
+    no vea respuestas viejas; limpiar() libera la memoria al recargar.
+    """
+    FALLO = object()
+
+    def __init__(self, capacidad: int = RESPUESTAS_CACHE):
+        self.capacidad = capacidad
+        self._entradas: 'OrderedDict[Tuple, Optional[Dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.huecos = 0
+
+    @staticmethod
+    def clave(pregunta_norm: str, personaje: Dict,
+              catalogo: Optional['CatalogoPersonajes'] = None) -> Optional[Tuple]:
+        """
+        Solo para personajes del roster de la partida (por defecto el
+        actual), los que resuelve su vector precalculado; uno inventado por
+        el cliente o el analizador legacy, que lee el dict entero, no se cachean.
+        """
+        if ANALIZADOR_LEGACY:
+            return None
+        catalogo = catalogo or CATALOGO
+        id_personaje = personaje.get('_id')
+        vector = catalogo.vectores.get(id_personaje)
+        if vector is None or vector.nombre != personaje.get('nombre'):
+            return None
+        return pregunta_norm, id_personaje, catalogo.version
+
+    def obtener(self, clave: Optional[Tuple]):
+        """La respuesta cacheada (que puede ser None) o FALLO."""
+        if clave is None or not self.capacidad:
+            return CacheRespuestas.FALLO
+        with self._lock:
+            respuesta = self._entradas.get(clave, CacheRespuestas.FALLO)
+            if respuesta is CacheRespuestas.FALLO:
+                self.fallos += 1
+            else:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                if respuesta is None:
+                    self.huecos += 1
+            return respuesta
+
+    def guardar(self, clave: Optional[Tuple], respuesta: Optional[Dict]):
+        if clave is None or not self.capacidad:
+            return
+        with self._lock:
+            self._entradas[clave] = respuesta
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+                self.desalojos += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'capacidad': self.capacidad,
+                'entradas': len(self._entradas),
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'huecos_desde_cache': self.huecos,
+                'desalojos': self.desalojos,
+                'tasa_acierto': round(self.aciertos / consultas * 100, 2) if consultas else 0
+            }
+
+
+# ===================================================================
+# ANALIZADOR DE PREGUNTAS (VERSIÓN HÍBRIDA)
+# ===================================================================
+
+class AnalizadorPreguntas:
+    motor = MotorReglas(REGLAS, ANALIZADOR_CACHE_PALABRAS)
+    lemas = Lematizador(motor, errata_minima=ANALIZADOR_ERRATA_MINIMA, cache=ANALIZADOR_CACHE_PALABRAS)
+    cache = CacheRespuestas()
+
+    @staticmethod
+    def analizar(pregunta: str, personaje: Dict, catalogo: Optional['CatalogoPersonajes'] = None) -> Dict:
+        """'catalogo': la versión del roster a la que está fijada la partida (por defecto la vigente)."""
+        inicio = time.perf_counter()
+        pregunta_norm = Normalizador.normalizar(pregunta)
+        normalizada = time.perf_counter()
+        clave = CacheRespuestas.clave(pregunta_norm, personaje, catalogo)
+        respuesta = AnalizadorPreguntas.cache.obtener(clave)
+        if respuesta is CacheRespuestas.FALLO:
+            vector = None if ANALIZADOR_LEGACY else vector_de(personaje, catalogo)
+            respuesta = AnalizadorPreguntas.resolver(pregunta_norm, personaje, vector)
+            AnalizadorPreguntas.cache.guardar(clave, respuesta)
+        telemetria.observar('oracle_fase_segundos', normalizada - inicio, fase='normalizador')
+        telemetria.observar('oracle_fase_segundos', time.perf_counter() - normalizada, fase='analizador')
+        if respuesta is None:
+            registrar_hueco(pregunta, personaje, pregunta_norm)
+            return {'answer': 'No lo sé', 'clarification': 'No estoy seguro de cómo interpretar eso. ¿Podrías reformularlo?'}
+        return respuesta
+
+    @staticmethod
+    def resolver(pregunta_norm: str, personaje: Optional[Dict],
+                 vector: Optional[VectorRespuestas] = None) -> Optional[Dict]:
+        """
+        Respuesta para una pregunta ya normalizada, o None si no es
+        clasificable ni siquiera llevando sus palabras a lemas conocidos.
+        Con 'vector' (ya compilado) el motor no necesita el dict del personaje.
+        """
+        respuesta = AnalizadorPreguntas._resolver_directo(pregunta_norm, personaje, vector)
+        if respuesta is None and ANALIZADOR_LEMAS:
+            expandida = AnalizadorPreguntas.lemas.expandir(pregunta_norm)
+            if expandida != pregunta_norm:
+                respuesta = AnalizadorPreguntas._resolver_directo(expandida, personaje, vector)
+        return respuesta
+
+    @staticmethod
+    def _resolver_directo(pregunta_norm: str, personaje: Optional[Dict],
+                          vector: Optional[VectorRespuestas] = None) -> Optional[Dict]:
+        if ANALIZADOR_LEGACY:
+            return AnalizadorPreguntas._resolver_legacy(pregunta_norm, personaje)
+        return AnalizadorPreguntas.motor.resolver(pregunta_norm, vector or vector_de(personaje))
+
+    @staticmethod
+    def diferencias(preguntas: List[str], personajes: List[Dict]) -> List[Dict]:
+        """Compara el motor compilado con la cadena original; lista vacía si coinciden."""
+        diferencias = []
+        for pregunta in preguntas:
+            pregunta_norm = Normalizador.normalizar(pregunta)
+            for personaje in personajes:
+                esperada = AnalizadorPreguntas._resolver_legacy(pregunta_norm, personaje)
+                obtenida = AnalizadorPreguntas.motor.resolver(pregunta_norm, AnalizadorPreguntas.motor.compilar(personaje))
+                if esperada != obtenida:
+                    diferencias.append({
+                        'pregunta': pregunta,
+                        'personaje': personaje.get('nombre'),
+                        'legacy': esperada,
+                        'motor': obtenida
+                    })
+        return diferencias
+
+    @staticmethod
+    def _resolver_legacy(pregunta_norm: str, personaje: Dict) -> Optional[Dict]:
+        # ---------- TIPO ----------
+        if 'real' in pregunta_norm or 'existio' in pregunta_norm or 'carne y hueso' in pregunta_norm:
+            es_real = personaje.get('tipo') == 'real'
+            return {'answer': 'Sí' if es_real else 'No', 'clarification': ''}
+        if 'ficticio' in pregunta_norm or 'inventado' in pregunta_norm or 'imaginario' in pregunta_norm:
+            es_ficticio = personaje.get('tipo') == 'ficticio'
+            return {'answer': 'Sí' if es_ficticio else 'No', 'clarification': ''}
+
+        # ---------- GÉNERO ----------
+        if 'masculino' in pregunta_norm or 'hombre' in pregunta_norm:
+            es_hombre = personaje.get('genero') == 'masculino'
+            return {'answer': 'Sí' if es_hombre else 'No', 'clarification': ''}
+        if 'femenino' in pregunta_norm or 'mujer' in pregunta_norm or 'dama' in pregunta_norm:
+            es_mujer = personaje.get('genero') == 'femenino'
+            return {'answer': 'Sí' if es_mujer else 'No', 'clarification': ''}
+
+        # ---------- VITAL ----------
+        if 'vivo' in pregunta_norm or 'vive' in pregunta_norm:
+            vivo = personaje.get('vivo', False)
+            return {'answer': 'Sí' if vivo else 'No', 'clarification': ''}
+        if 'muerto' in pregunta_norm or 'murio' in pregunta_norm or 'fallecido' in pregunta_norm:
+            muerto = not personaje.get('vivo', True)
+            return {'answer': 'Sí' if muerto else 'No', 'clarification': ''}
+
+        # ---------- FAMA ----------
+        if 'famoso' in pregunta_norm or 'conocido' in pregunta_norm or 'celebre' in pregunta_norm:
+            famoso = personaje.get('famoso', False)
+            return {'answer': 'Sí' if famoso else 'No', 'clarification': ''}
+        if 'todo el mundo' in pregunta_norm or 'todo mundo' in pregunta_norm:
+            conocido = personaje.get('famoso', False)
+            return {'answer': 'Sí' if conocido else 'No', 'clarification': ''}
+
+        # ---------- RIQUEZA ----------
+        if 'rico' in pregunta_norm or 'millonario' in pregunta_norm or 'adinerado' in pregunta_norm:
+            rico = personaje.get('rico', False)
+            return {'answer': 'Sí' if rico else 'No', 'clarification': ''}
+        if 'pobre' in pregunta_norm:
+            pobre = personaje.get('pobre', False)
+            return {'answer': 'Sí' if pobre else 'No', 'clarification': ''}
+
+        # ---------- PROFESIÓN ----------
+        if 'cientifico' in pregunta_norm:
+            es_cientifico = personaje.get('profesion') in ['cientifico', 'cientifica'] or personaje.get('area') in ['fisica', 'quimica']
+            return {'answer': 'Sí' if es_cientifico else 'No', 'clarification': ''}
+        if 'artista' in pregunta_norm or 'pintor' in pregunta_norm:
+            es_artista = personaje.get('profesion') == 'artista' or personaje.get('area') == 'arte'
+            return {'answer': 'Sí' if es_artista else 'No', 'clarification': ''}
+        if 'escritor' in pregunta_norm or 'autor' in pregunta_norm:
+            es_escritor = personaje.get('profesion') == 'escritor' or personaje.get('area') == 'literatura'
+            return {'answer': 'Sí' if es_escritor else 'No', 'clarification': ''}
+        if 'militar' in pregunta_norm or 'soldado' in pregunta_norm or 'guerrero' in pregunta_norm:
+            es_militar = personaje.get('profesion') in ['militar', 'guerrera'] or personaje.get('area') == 'guerra'
             return {'answer': 'Sí' if es_militar else 'No', 'clarification': ''}
         if 'mago' in pregunta_norm or 'bruja' in pregunta_norm:
             es_mago = personaje.get('profesion') in ['mago', 'bruja'] or personaje.get('area') == 'magia'
@@ -542,107 +2119,1487 @@ class AnalizadorPreguntas:
             conservador = personaje.get('ideologia', {}).get('conservador', False)
             return {'answer': 'Sí' if conservador else 'No', 'clarification': ''}
 
-        # ---------- ICÓNICO ----------
-        if 'iconico' in pregunta_norm or 'figura iconica' in pregunta_norm:
-            iconico = personaje.get('impacto', {}).get('iconico', False)
-            return {'answer': 'Sí' if iconico else 'No', 'clarification': ''}
+        # ---------- ICÓNICO ----------
+        if 'iconico' in pregunta_norm or 'figura iconica' in pregunta_norm:
+            iconico = personaje.get('impacto', {}).get('iconico', False)
+            return {'answer': 'Sí' if iconico else 'No', 'clarification': ''}
+
+        # ---------- NO CLASIFICABLE ----------
+        return None
+
+
+# ===================================================================
+# VECTORES DE RESPUESTAS POR PERSONAJE
+# ===================================================================
+
+def compilar_vectores(personajes: List[Dict]) -> Dict[int, VectorRespuestas]:
+    return {p.get('_id'): AnalizadorPreguntas.motor.compilar(p) for p in personajes}
+
+
+def vector_de(personaje: Dict, catalogo: Optional['CatalogoPersonajes'] = None) -> VectorRespuestas:
+    """
+    Vector precalculado del personaje en 'catalogo' (por defecto el vigente);
+    si no es uno de ese roster se compila al vuelo.
+    """
+    vector = (catalogo or CATALOGO).vectores.get(personaje.get('_id'))
+    if vector is None or vector.nombre != personaje.get('nombre'):
+        vector = AnalizadorPreguntas.motor.compilar(personaje)
+    return vector
+
+
+def validar_personajes(personajes: List[Dict]) -> List[Dict]:
+    """Personajes a los que les faltan atributos de los que dependen las reglas."""
+    problemas = []
+    for personaje in personajes:
+        for regla in REGLAS:
+            faltan = regla.faltantes(personaje)
+            if faltan:
+                problemas.append({
+                    'personaje': personaje.get('nombre', 'desconocido'),
+                    'regla': regla.id,
+                    'faltan': faltan
+                })
+    return problemas
+
+
+def reportar_validacion(personajes: List[Dict]) -> List[Dict]:
+    problemas = validar_personajes(personajes)
+    personajes_por_campo = defaultdict(set)
+    reglas_por_campo = defaultdict(set)
+    for problema in problemas:
+        for campo in problema['faltan']:
+            personajes_por_campo[campo].add(problema['personaje'])
+            reglas_por_campo[campo].add(problema['regla'])
+    for campo, nombres in sorted(personajes_por_campo.items(), key=lambda x: -len(x[1])):
+        print(f"⚠️  {len(nombres)} personajes sin '{campo}' (reglas: {', '.join(sorted(reglas_por_campo[campo]))})",
+              file=sys.stderr)
+    return problemas
+
+
+class MatrizRespuestas:
+    """
+    Las mismas respuestas por columnas: para cada regla un entero cuyo bit j
+    dice si el personaje j del roster tiene el hecho. Un conjunto de
+    candidatos es otra máscara, así que filtrar por una respuesta es un AND
+    y contar cuántos quedan es un bit_count, sin recorrer personajes.
+    """
+
+    def __init__(self, vectores: List[VectorRespuestas], columnas: Optional[List[int]] = None):
+        self.vectores = vectores
+        self.todos = (1 << len(vectores)) - 1
+        if columnas is not None:
+            self.columnas = columnas
+            return
+        tamano = (len(vectores) + 7) // 8
+        columnas = [bytearray(tamano) for _ in AnalizadorPreguntas.motor.con_hecho]
+        for j, vector in enumerate(vectores):
+            bits = vector.bits
+            while bits:
+                bajo = bits & -bits
+                columnas[bajo.bit_length() - 1][j >> 3] |= 1 << (j & 7)
+                bits ^= bajo
+        self.columnas = [int.from_bytes(columna, 'little') for columna in columnas]
+
+    def filtrar(self, mascara: int, regla: Regla, si: bool) -> int:
+        columna = self.columnas[regla.bit]
+        return mascara & columna if si else mascara & ~columna & self.todos
+
+    def ganancia(self, mascara: int, regla: Regla) -> float:
+        """Entropía (bits) de la respuesta a la regla sobre los candidatos: ganancia de información esperada."""
+        total = mascara.bit_count()
+        si = (mascara & self.columnas[regla.bit]).bit_count()
+        if total == 0 or si == 0 or si == total:
+            return 0.0
+        p = si / total
+        return -p * math.log2(p) - (1 - p) * math.log2(1 - p)
+
+    def candidatos(self, preguntas: List[str], respuestas: List[str]) -> int:
+        """Máscara de personajes coherentes con las respuestas Sí/No dadas hasta ahora."""
+        mascara = self.todos
+        for pregunta, respuesta in zip(preguntas, respuestas):
+            if respuesta not in ('Sí', 'No'):
+                continue
+            # Con lemas, como al responder: si no, una respuesta aceptada por su lema no filtraría
+            regla = AnalizadorPreguntas.lemas.regla_binaria(Normalizador.normalizar(pregunta))[1]
+            if regla is not None:
+                mascara = self.filtrar(mascara, regla, respuesta == 'Sí')
+        return mascara
+
+
+# ===================================================================
+# BÚSQUEDA DIFUSA
+# ===================================================================
+
+def distancia_edicion(a: str, b: str, maximo: Optional[int] = None) -> int:
+    """
+    Distancia de edición en la que cambiar de orden dos letras seguidas
+    ("einstien") cuenta como un solo error (Damerau, alineamiento óptimo).
+    Con 'maximo' solo se calcula la banda |i - j| <= maximo y se abandona en
+    cuanto una fila entera lo supera; en ese caso devuelve maximo + 1.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if maximo is None:
+        maximo = len(a)
+    infinito = maximo + 1
+    if len(a) - len(b) > maximo:
+        return infinito
+    previa = None
+    anterior = [j if j <= maximo else infinito for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        desde, hasta = max(1, i - maximo), min(len(b), i + maximo)
+        actual = [infinito] * (len(b) + 1)
+        if i <= maximo:
+            actual[0] = i
+        for j in range(desde, hasta + 1):
+            cb = b[j - 1]
+            valor = min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (ca != cb))
+            if previa is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                valor = min(valor, previa[j - 2] + 1)
+            actual[j] = valor
+        if min(actual[desde - 1:hasta + 1]) > maximo:
+            return infinito
+        previa, anterior = anterior, actual
+    return min(anterior[-1], infinito)
+
+
+def similitud(a: str, b: str, minimo: float = 0.0) -> float:
+    """1 - distancia de edición relativa a la cadena más larga; 0 si no llega a 'minimo'."""
+    if not a or not b:
+        return 0.0
+    largo = max(len(a), len(b))
+    maximo = int((1 - minimo) * largo + 1e-9)
+    distancia = distancia_edicion(a, b, maximo)
+    return 0.0 if distancia > maximo else 1 - distancia / largo
+
+
+class IndiceTrigramas:
+    """
+    Índice invertido trigrama -> entradas. Los candidatos son las entradas
+    que más trigramas comparten con la consulta (el conteo lo hace Counter
+    en C); solo a esos pocos se les calcula la distancia de edición. Los
+    trigramas se recorren de más raro a más común y se dejan de contar al
+    pasar de 'presupuesto' entradas, una vez usada al menos la mitad: los
+    muy comunes ("  a") apenas discriminan y son los que más cuestan.
+    """
+
+    def __init__(self, entradas: List[Tuple[str, object]], candidatos: int = 8, presupuesto: int = 2000):
+        self.entradas = entradas
+        self.candidatos = candidatos
+        self.presupuesto = presupuesto
+        self.indice = defaultdict(list)
+        for k, (texto, _) in enumerate(entradas):
+            for trigrama in self.trigramas(texto):
+                self.indice[trigrama].append(k)
+
+    @staticmethod
+    def trigramas(texto: str) -> set:
+        relleno = f"  {texto} "
+        return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+    def buscar(self, texto: str, minimo: float = 0.0) -> List[Tuple[float, str, object]]:
+        """(similitud, texto, valor) de los candidatos con similitud >= minimo, de mayor a menor."""
+        listas = sorted((self.indice.get(trigrama, ()) for trigrama in self.trigramas(texto)), key=len)
+        conteo = Counter()
+        contadas = 0
+        for usadas, lista in enumerate(listas):
+            if contadas + len(lista) > self.presupuesto and 2 * usadas >= len(listas):
+                break
+            conteo.update(lista)
+            contadas += len(lista)
+        resultados = []
+        for k, _ in conteo.most_common(self.candidatos):
+            puntuacion = similitud(texto, self.entradas[k][0], minimo)
+            if puntuacion and puntuacion >= minimo:
+                resultados.append((puntuacion,) + self.entradas[k])
+        resultados.sort(key=itemgetter(0), reverse=True)
+        return resultados
+
+
+# ===================================================================
+# SERIALIZACIÓN JSON
+# ===================================================================
+
+# orjson es opcional: si no está instalado (o ORACLE_JSON_RAPIDO=0) se usa json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+ORJSON = orjson if JSON_RAPIDO else None
+
+
+def _a_json_stdlib(objeto) -> bytes:
+    return json.dumps(objeto, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def a_json(objeto) -> bytes:
+    """JSON compacto en UTF-8, con orjson si está disponible."""
+    if ORJSON is not None:
+        try:
+            return ORJSON.dumps(objeto)
+        except TypeError:
+            # Claves no str o enteros de más de 64 bits: el json estándar sí los acepta
+            pass
+    return _a_json_stdlib(objeto)
+
+
+def de_json(datos: bytes):
+    return ORJSON.loads(datos) if ORJSON is not None else json.loads(datos)
+
+
+def respuesta_json(cuerpo, estado: int = 200) -> Response:
+    """Respuesta application/json a partir de un objeto o de bytes ya serializados."""
+    if not isinstance(cuerpo, (bytes, bytearray)):
+        cuerpo = a_json(cuerpo)
+    return Response(cuerpo, status=estado, mimetype='application/json')
+
+
+# ===================================================================
+# CATÁLOGO DE PERSONAJES
+# ===================================================================
+
+class CatalogoPersonajes:
+    """
+    El roster indexado al cargarlo: por _id, por nombre normalizado (y sus
+    alias) y un índice invertido atributo -> valor -> ids, con los campos
+    anidados como 'rol.lider'. "Ficticios de Marvel" es la intersección de
+    dos conjuntos. Guarda también los vectores de respuestas, la matriz
+    por columnas y el JSON de cada personaje ya serializado, así que es la
+    única fuente de verdad del roster.
+    """
+
+    NO_INDEXADOS = ('_id', 'nombre', 'alias', 'pistas')
+
+    def __init__(self, personajes: List[Dict], version: str = ''):
+        self.personajes = personajes
+        self.version = version
+        self.binario = False
+        self.por_id = {}
+        self.por_nombre = {}
+        self.nombres = {}
+        self.posicion = {}
+        indices = defaultdict(lambda: defaultdict(set))
+        for posicion, personaje in enumerate(personajes):
+            id_personaje = personaje.get('_id')
+            self.por_id[id_personaje] = personaje
+            self.posicion.setdefault(id_personaje, posicion)
+            nombres = {Normalizador.normalizar(nombre)
+                       for nombre in [personaje.get('nombre', '')] + list(personaje.get('alias', []))}
+            nombres.discard('')
+            self.nombres[id_personaje] = frozenset(nombres)
+            for nombre in nombres:
+                self.por_nombre.setdefault(nombre, id_personaje)
+            for atributo, valor in self._atributos(personaje):
+                indices[atributo][valor].add(id_personaje)
+        self.indices = {atributo: dict(valores) for atributo, valores in indices.items()}
+        self.vectores = compilar_vectores(personajes)
+        self.matriz = MatrizRespuestas(list(self.vectores.values()))
+        self._serializados = [a_json(personaje) for personaje in personajes]
+        self._difuso = None
+        self._indice_matriz = None
+
+    @classmethod
+    def desde_binario(cls, ruta: str) -> 'CatalogoPersonajes':
+        """Catálogo sobre un roster compilado: índices, vectores y matriz salen del mmap sin parsear los personajes."""
+        roster = RosterBinario(ruta)
+        catalogo = cls.__new__(cls)
+        catalogo.personajes = roster
+        catalogo.version = roster.version
+        catalogo.binario = True
+        catalogo.posicion = {}
+        catalogo.nombres = {}
+        catalogo.por_nombre = {}
+        for posicion, id_personaje in enumerate(roster.ids):
+            catalogo.posicion.setdefault(id_personaje, posicion)
+            nombres = frozenset(nombre for nombre in roster.alias[posicion].split('\n') if nombre)
+            catalogo.nombres[id_personaje] = nombres
+            for nombre in nombres:
+                catalogo.por_nombre.setdefault(nombre, id_personaje)
+        catalogo.por_id = VistaPorId(catalogo.posicion, roster)
+        catalogo.indices = roster.indices()
+        catalogo.vectores = roster.vectores()
+        catalogo.matriz = MatrizRespuestas(list(catalogo.vectores.values()), roster.columnas_matriz())
+        catalogo._difuso = None
+        catalogo._indice_matriz = None
+        return catalogo
+
+    def __len__(self) -> int:
+        return len(self.personajes)
+
+    def serializado(self, posicion: int) -> bytes:
+        """JSON del personaje en esa posición, serializado una sola vez al cargar el roster."""
+        if self.binario:
+            return self.personajes.serializado(posicion)
+        return self._serializados[posicion]
+
+    @staticmethod
+    def _atributos(personaje: Dict) -> Iterator[Tuple[str, object]]:
+        for clave, valor in personaje.items():
+            if clave in CatalogoPersonajes.NO_INDEXADOS:
+                continue
+            if isinstance(valor, dict):
+                for subclave, subvalor in valor.items():
+                    yield from CatalogoPersonajes._valores(f"{clave}.{subclave}", subvalor)
+            else:
+                yield from CatalogoPersonajes._valores(clave, valor)
+
+    @staticmethod
+    def _valores(atributo: str, valor) -> Iterator[Tuple[str, object]]:
+        for elemento in (valor if isinstance(valor, list) else [valor]):
+            if isinstance(elemento, str):
+                yield atributo, Normalizador.normalizar(elemento)
+            elif elemento is None or isinstance(elemento, (bool, int, float)):
+                yield atributo, elemento
+
+    def buscar_nombre(self, texto: str) -> Optional[Dict]:
+        id_personaje = self.por_nombre.get(Normalizador.normalizar(texto))
+        return None if id_personaje is None else self.por_id[id_personaje]
+
+    def indice_matriz(self) -> Dict:
+        """_id -> posición del personaje en la matriz (y en sus columnas de bits)."""
+        if self._indice_matriz is None:
+            self._indice_matriz = {vector.id: j for j, vector in enumerate(self.matriz.vectores)}
+        return self._indice_matriz
+
+    def indice_difuso(self) -> IndiceTrigramas:
+        """
+        Trigramas de los nombres y alias normalizados y de las palabras sueltas
+        que identifican a un solo personaje ("einstein", "leonardo"). Se
+        construye la primera vez que hace falta.
+        """
+        if self._difuso is None:
+            ids_por_palabra = defaultdict(set)
+            for id_personaje, nombres in self.nombres.items():
+                for nombre in nombres:
+                    for palabra in nombre.split():
+                        if len(palabra) >= ADIVINAR_PALABRA_MINIMA:
+                            ids_por_palabra[palabra].add(id_personaje)
+            entradas = [(nombre, id_personaje) for id_personaje, nombres in self.nombres.items() for nombre in nombres]
+            entradas += [(palabra, next(iter(ids))) for palabra, ids in ids_por_palabra.items()
+                         if len(ids) == 1 and palabra not in self.por_nombre]
+            self._difuso = IndiceTrigramas(entradas)
+        return self._difuso
+
+    def coincidencia(self, texto: str) -> Optional[Dict]:
+        """
+        El personaje del roster más parecido a 'texto' si supera ADIVINAR_UMBRAL
+        y no empata con otro distinto: {'id', 'nombre', 'score'}.
+        """
+        norm = Normalizador.normalizar(texto)
+        if norm in self.por_nombre:
+            return {'id': self.por_nombre[norm], 'nombre': self.por_id[self.por_nombre[norm]]['nombre'], 'score': 1.0}
+        if not norm:
+            return None
+        resultados = self.indice_difuso().buscar(norm, ADIVINAR_UMBRAL)
+        if not resultados:
+            return None
+        score, _, id_personaje = resultados[0]
+        if any(otro != id_personaje and s == score for s, _, otro in resultados[1:]):
+            return None
+        return {'id': id_personaje, 'nombre': self.por_id[id_personaje]['nombre'], 'score': round(score, 3)}
+
+    def evaluar_intento(self, personaje: Dict, texto: str) -> Tuple[bool, Optional[Dict]]:
+        """
+        ¿'texto' nombra al personaje? Devuelve también el personaje con el que
+        se ha emparejado y la similitud. Los del roster aceptan sus alias y,
+        con ADIVINAR_DIFUSO, erratas y palabras sueltas del nombre.
+        """
+        norm = Normalizador.normalizar(texto)
+        id_personaje = personaje.get('_id')
+        nombres = self.nombres.get(id_personaje)
+        if nombres is None or self.por_id[id_personaje].get('nombre') != personaje.get('nombre'):
+            # Personaje fuera del roster (modo legacy): solo se compara con su nombre
+            score = similitud(norm, Normalizador.normalizar(personaje.get('nombre', '')))
+            correcto = score == 1 or (ADIVINAR_DIFUSO and score >= ADIVINAR_UMBRAL)
+            return correcto, {'nombre': personaje.get('nombre', ''), 'score': round(score, 3)}
+        if norm in nombres:
+            return True, {'nombre': personaje['nombre'], 'score': 1.0}
+        mejor = self.coincidencia(norm) if ADIVINAR_DIFUSO else None
+        if mejor is None:
+            return False, None
+        return mejor['id'] == id_personaje, {'nombre': mejor['nombre'], 'score': mejor['score']}
+
+    def ids(self, filtros: Dict) -> set:
+        """Ids de los personajes con todos los {atributo: valor} pedidos; los textos se normalizan."""
+        if not filtros:
+            return set(self.por_id)
+        conjuntos = sorted((self.indices.get(atributo, {}).get(
+            Normalizador.normalizar(valor) if isinstance(valor, str) else valor, set())
+            for atributo, valor in filtros.items()), key=len)
+        return set(conjuntos[0]).intersection(*conjuntos[1:])
+
+    def filtrar(self, filtros: Dict) -> List[Dict]:
+        """Personajes que cumplen los filtros, en el orden del roster."""
+        if not filtros:
+            return list(self.personajes)
+        return [self.por_id[i] for i in sorted(self.ids(filtros), key=self.posicion.get)]
+
+    @staticmethod
+    def valor_consulta(texto: str):
+        """Valor de un filtro recibido como texto (query string): 'true' -> True, '19' -> 19."""
+        if texto in ('true', 'false'):
+            return texto == 'true'
+        if texto.lstrip('-').isdigit():
+            return int(texto)
+        return texto
+
+
+# ===================================================================
+# ROSTER BINARIO (MMAP)
+# ===================================================================
+
+class TablaTextos:
+    """Tabla de textos dentro del mmap: uint32 cantidad, uint32 offsets[cantidad + 1] y los bytes UTF-8."""
+
+    def __init__(self, buffer: memoryview):
+        self.cantidad = struct.unpack_from('I', buffer, 0)[0]
+        fin_offsets = 4 + 4 * (self.cantidad + 1)
+        self.offsets = buffer[4:fin_offsets].cast('I')
+        self.datos = buffer[fin_offsets:]
+
+    def __len__(self) -> int:
+        return self.cantidad
+
+    def __getitem__(self, i: int) -> str:
+        return str(self.datos[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def crudo(self, i: int) -> bytes:
+        return bytes(self.datos[self.offsets[i]:self.offsets[i + 1]])
+
+    @staticmethod
+    def serializar(textos: List[str]) -> bytes:
+        codificados = [texto.encode('utf-8') for texto in textos]
+        offsets = array('I', [0])
+        for codificado in codificados:
+            offsets.append(offsets[-1] + len(codificado))
+        return struct.pack('I', len(codificados)) + offsets.tobytes() + b''.join(codificados)
+
+
+class ValoresIndice(Mapping):
+    """Valores de un atributo en el roster binario; el conjunto de ids se arma al consultarlo."""
+
+    def __init__(self, roster: 'RosterBinario', claves: Dict):
+        self._roster = roster
+        self._claves = claves
+        self._conjuntos = {}
+
+    def __getitem__(self, valor) -> set:
+        conjunto = self._conjuntos.get(valor)
+        if conjunto is None:
+            k = self._claves[valor]
+            ids = self._roster.ids
+            conjunto = {ids[j] for j in self._roster.posiciones[self._roster.listas[k]:self._roster.listas[k + 1]]}
+            self._conjuntos[valor] = conjunto
+        return conjunto
+
+    def __iter__(self):
+        return iter(self._claves)
+
+    def __len__(self) -> int:
+        return len(self._claves)
+
+
+class VistaPorId(Mapping):
+    """_id -> personaje sobre un roster perezoso: solo decodifica los personajes que se piden."""
+
+    def __init__(self, posicion: Dict, personajes):
+        self._posicion = posicion
+        self._personajes = personajes
+
+    def __getitem__(self, id_personaje) -> Dict:
+        return self._personajes[self._posicion[id_personaje]]
+
+    def __contains__(self, id_personaje) -> bool:
+        return id_personaje in self._posicion
+
+    def __iter__(self):
+        return iter(self._posicion)
+
+    def __len__(self) -> int:
+        return len(self._posicion)
+
+
+class RosterBinario(Sequence):
+    """
+    personajes.bin abierto con mmap, compartido entre workers a través de la
+    caché de páginas. Las columnas de ancho fijo (ids, siglos, bits de
+    respuestas, columnas de la matriz) se leen sin copiar; el dict completo
+    de un personaje solo se decodifica cuando alguien lo pide, y se guardan
+    los ROSTER_CACHE_PERSONAJES más usados.
+    """
+
+    MAGICO = b'ORCLBIN1'
+    SIN_SIGLO = -32768
+
+    def __init__(self, ruta: str):
+        with open(ruta, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if bytes(buffer[:8]) != self.MAGICO:
+            raise ValueError(f"{ruta} no es un roster compilado")
+        largo = struct.unpack_from('I', buffer, 8)[0]
+        self.cabecera = json.loads(str(buffer[12:12 + largo], 'utf-8'))
+        if self.cabecera['orden'] != sys.byteorder or self.cabecera['firma'] != firma_roster():
+            raise ValueError(f"{ruta} se compiló con otras reglas o en otra arquitectura")
+
+        def seccion(nombre: str) -> memoryview:
+            inicio, tamano = self.cabecera['secciones'][nombre]
+            return buffer[inicio:inicio + tamano]
+
+        self.version = self.cabecera['version']
+        self.n = self.cabecera['personajes']
+        self.ids = seccion('ids').cast('q')
+        self.siglos = seccion('siglos').cast('h')
+        self.bits = seccion('bits')
+        self.columnas = seccion('columnas')
+        self.nombres = TablaTextos(seccion('nombres'))
+        self.alias = TablaTextos(seccion('alias'))
+        self.datos = TablaTextos(seccion('datos'))
+        self.claves = TablaTextos(seccion('claves'))
+        self.listas = seccion('listas').cast('I')
+        self.posiciones = seccion('posiciones').cast('I')
+        self.personaje = lru_cache(maxsize=ROSTER_CACHE_PERSONAJES)(self._personaje)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __getitem__(self, i: int) -> Dict:
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+        return self.personaje(i)
+
+    def _personaje(self, i: int) -> Dict:
+        return json.loads(self.datos[i])
+
+    def serializado(self, i: int) -> bytes:
+        """El personaje tal como quedó compilado (JSON compacto), sin decodificarlo."""
+        return self.datos.crudo(i)
+
+    def vectores(self) -> Dict[int, VectorRespuestas]:
+        ancho = self.cabecera['bytes_bits']
+        vectores = {}
+        for j in range(self.n):
+            inicio, fin = self.siglos[2 * j], self.siglos[2 * j + 1]
+            vectores[self.ids[j]] = VectorRespuestas(
+                self.ids[j], self.nombres[j],
+                int.from_bytes(self.bits[j * ancho:(j + 1) * ancho], 'little'),
+                None if inicio == self.SIN_SIGLO else inicio,
+                None if fin == self.SIN_SIGLO else fin)
+        return vectores
+
+    def columnas_matriz(self) -> List[int]:
+        ancho = self.cabecera['bytes_columna']
+        return [int.from_bytes(self.columnas[k * ancho:(k + 1) * ancho], 'little')
+                for k in range(len(self.cabecera['reglas']))]
+
+    def indices(self) -> Dict[str, ValoresIndice]:
+        claves = defaultdict(dict)
+        for k in range(len(self.claves)):
+            atributo, valor = self.claves[k].split('\x00', 1)
+            claves[atributo][json.loads(valor)] = k
+        return {atributo: ValoresIndice(self, valores) for atributo, valores in claves.items()}
+
+
+def firma_roster() -> str:
+    """
+    Lo que tiene que coincidir entre el compilador y el servidor: las reglas
+    completas (disparadores, campos y predicado con sus parámetros, no solo
+    los ids) y la normalización. Cambiar cualquiera invalida personajes.bin.
+    """
+    contenido = json.dumps({
+        'reglas': [{
+            'id': regla.id,
+            'grupos': regla.grupos,
+            'excluye': regla.excluye,
+            'campos': regla.campos,
+            'hecho': regla.hecho.firma if regla.hecho else None,
+            'responder': regla.responder.__name__ if regla.responder else None
+        } for regla in REGLAS],
+        'sinonimos': Normalizador.SINONIMOS,
+        'signos': Normalizador.SIGNOS
+    }, sort_keys=True, default=str)
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()[:12]
+
+
+def compilar_roster(origen: str = PERSONAJES_FILE, destino: str = ROSTER_BINARIO_FILE) -> Dict:
+    """
+    Compila personajes.json al formato binario: cabecera JSON con las
+    secciones y, alineadas a 8 bytes, las columnas de ancho fijo, las
+    tablas de textos, los dicts completos en JSON compacto y el índice
+    invertido como listas de posiciones.
+    """
+    inicio = time.perf_counter()
+    ruta_origen = ruta_personajes(origen)
+    personajes, version = leer_personajes(ruta_origen)
+    errores = errores_roster(personajes)
+    if errores:
+        raise ValueError(f"Roster no válido: {'; '.join(errores)}")
+    catalogo = CatalogoPersonajes(personajes, version)
+    problemas = reportar_validacion(personajes)
+    n = len(personajes)
+    reglas = AnalizadorPreguntas.motor.con_hecho
+    bytes_bits = (len(reglas) + 7) // 8
+    bytes_columna = (n + 7) // 8
+
+    ids, siglos, bits = array('q'), array('h'), bytearray()
+    for personaje in personajes:
+        vector = catalogo.vectores[personaje['_id']]
+        ids.append(vector.id)
+        for siglo in (vector.siglo_inicio, vector.siglo_fin):
+            siglos.append(RosterBinario.SIN_SIGLO if siglo is None else siglo)
+        bits += vector.bits.to_bytes(bytes_bits, 'little')
+
+    claves, listas, posiciones = [], array('I', [0]), array('I')
+    for atributo, valores in catalogo.indices.items():
+        for valor, ids_valor in valores.items():
+            claves.append(f"{atributo}\x00{json.dumps(valor, ensure_ascii=False)}")
+            posiciones.extend(sorted(catalogo.posicion[i] for i in ids_valor))
+            listas.append(len(posiciones))
+
+    secciones = {
+        'ids': ids.tobytes(),
+        'siglos': siglos.tobytes(),
+        'bits': bytes(bits),
+        'columnas': b''.join(columna.to_bytes(bytes_columna, 'little') for columna in catalogo.matriz.columnas),
+        'nombres': TablaTextos.serializar([p['nombre'] for p in personajes]),
+        'alias': TablaTextos.serializar(['\n'.join(sorted(catalogo.nombres[p['_id']])) for p in personajes]),
+        'datos': TablaTextos.serializar([json.dumps(p, ensure_ascii=False, separators=(',', ':')) for p in personajes]),
+        'claves': TablaTextos.serializar(claves),
+        'listas': listas.tobytes(),
+        'posiciones': posiciones.tobytes()
+    }
+
+    cabecera = {
+        'version': version,
+        'firma': firma_roster(),
+        'orden': sys.byteorder,
+        'personajes': n,
+        'reglas': [regla.id for regla in reglas],
+        'bytes_bits': bytes_bits,
+        'bytes_columna': bytes_columna,
+        'secciones': {}
+    }
+    # La cabecera ocupa un hueco fijo para poder calcular los offsets antes de escribirla
+    reserva = len(json.dumps(cabecera).encode('utf-8')) + 64 * len(secciones) + 64
+    posicion = 12 + reserva
+    for nombre, contenido in secciones.items():
+        posicion += -posicion % 8
+        cabecera['secciones'][nombre] = [posicion, len(contenido)]
+        posicion += len(contenido)
+    cabecera_bytes = json.dumps(cabecera).encode('utf-8').ljust(reserva)
+
+    ruta_destino = ruta_personajes(destino)
+    temporal = f"{ruta_destino}.tmp"
+    with open(temporal, 'wb') as f:
+        f.write(RosterBinario.MAGICO + struct.pack('I', reserva) + cabecera_bytes)
+        for nombre, contenido in secciones.items():
+            f.write(b'\0' * (cabecera['secciones'][nombre][0] - f.tell()))
+            f.write(contenido)
+    os.replace(temporal, ruta_destino)
+
+    return {
+        'personajes': n,
+        'version': version,
+        'bytes_json': os.path.getsize(ruta_origen),
+        'bytes_binario': os.path.getsize(ruta_destino),
+        'atributos_faltantes': len(problemas),
+        'segundos': round(time.perf_counter() - inicio, 4),
+        'destino': ruta_destino
+    }
+
+
+def cargar_catalogo() -> CatalogoPersonajes:
+    """El roster binario si está compilado a partir del personajes.json actual; si no, el JSON."""
+    ruta_binaria = ruta_personajes(ROSTER_BINARIO_FILE)
+    if ROSTER_BINARIO and os.path.exists(ruta_binaria):
+        try:
+            catalogo = CatalogoPersonajes.desde_binario(ruta_binaria)
+            ruta_json = ruta_personajes()
+            if not os.path.exists(ruta_json) or catalogo.version == version_archivo(ruta_json):
+                print(f"✅ {len(catalogo)} personajes cargados desde {ruta_binaria} (mmap)", file=sys.stderr)
+                return catalogo
+            print(f"⚠️  {ruta_binaria} no corresponde al personajes.json actual, se ignora", file=sys.stderr)
+        except Exception as e:
+            print(f"⚠️  No se pudo abrir {ruta_binaria}: {e}", file=sys.stderr)
+    return CatalogoPersonajes(*cargar_personajes())
+
+
+CATALOGO = cargar_catalogo()
+
+if not CATALOGO.personajes:
+    print("=" * 60, file=sys.stderr)
+    print("⚠️  ADVERTENCIA: No se cargaron personajes", file=sys.stderr)
+    print("Asegúrate de que personajes.json existe en el mismo directorio", file=sys.stderr)
+    print("=" * 60, file=sys.stderr)
+
+if not CATALOGO.binario:
+    reportar_validacion(CATALOGO.personajes)
+
+
+# ===================================================================
+# RECARGA EN CALIENTE DEL ROSTER
+# ===================================================================
+
+# Versión -> catálogo, de la más antigua a la vigente. Las partidas guardan
+# la versión con la que empezaron y siguen resolviendo su personaje en ella.
+CATALOGOS = OrderedDict([(CATALOGO.version, CATALOGO)])
+ULTIMA_RECARGA: Optional[Dict] = None
+_recarga_lock = threading.Lock()
+
+
+def catalogo_de(version: Optional[str]) -> Optional[CatalogoPersonajes]:
+    return CATALOGOS.get(version)
+
+
+def personaje_de_partida(memoria: 'MemoriaPartida') -> Optional[Dict]:
+    """
+    Personaje de una partida: el de su versión del catálogo si sigue
+    retenida; si no, el mismo personaje (por id y nombre, o solo por nombre)
+    en el catálogo vigente.
+    """
+    catalogo = catalogo_de(memoria.catalogo)
+    if catalogo is not None and memoria.personaje_id in catalogo.por_id:
+        return catalogo.por_id[memoria.personaje_id]
+    actual = CATALOGO
+    personaje = actual.por_id.get(memoria.personaje_id)
+    if personaje is not None and personaje.get('nombre') == memoria.personaje_nombre:
+        return personaje
+    return actual.buscar_nombre(memoria.personaje_nombre)
+
+
+def errores_roster(personajes: List[Dict]) -> List[str]:
+    """Problemas que impiden publicar un roster (los atributos que falten solo se avisan)."""
+    errores = []
+    if not personajes:
+        errores.append("el roster está vacío")
+    ids = Counter(p.get('_id') for p in personajes)
+    if None in ids:
+        errores.append(f"{ids.pop(None)} personajes sin '_id'")
+    repetidos = sorted(str(i) for i, n in ids.items() if n > 1)
+    if repetidos:
+        errores.append(f"'_id' repetidos: {', '.join(repetidos)}")
+    sin_nombre = sum(1 for p in personajes if not p.get('nombre'))
+    if sin_nombre:
+        errores.append(f"{sin_nombre} personajes sin 'nombre'")
+    return errores
+
+
+def recargar_catalogo(archivo: str = PERSONAJES_FILE) -> Dict:
+    """
+    Lee, valida e indexa el roster nuevo sin tocar el vigente y lo publica
+    con una sola asignación: las peticiones en curso terminan con el
+    catálogo anterior. Lanza ValueError si el roster no es válido.
+    """
+    global CATALOGO, ULTIMA_RECARGA
+    with _recarga_lock:
+        inicio = time.perf_counter()
+        ruta = ruta_personajes(archivo)
+        personajes, version = leer_personajes(ruta)
+        if version == CATALOGO.version:
+            return {'recargado': False, 'version': version, 'personajes': len(CATALOGO)}
+        errores = errores_roster(personajes)
+        if errores:
+            raise ValueError(f"Roster no válido: {'; '.join(errores)}")
+        catalogo = CatalogoPersonajes(personajes, version)
+        problemas = validar_personajes(personajes)
+        CATALOGOS[version] = catalogo
+        CATALOGOS.move_to_end(version)
+        while len(CATALOGOS) > CATALOGO_VERSIONES:
+            CATALOGOS.popitem(last=False)
+        CATALOGO = catalogo
+        AnalizadorPreguntas.cache.limpiar()
+        ULTIMA_RECARGA = {
+            'recargado': True,
+            'version': version,
+            'personajes': len(catalogo),
+            'bytes': os.path.getsize(ruta),
+            'segundos': round(time.perf_counter() - inicio, 4),
+            'atributos_faltantes': len(problemas),
+            'fecha': datetime.now().isoformat()
+        }
+    print(f"🔄 Roster recargado: {len(catalogo)} personajes, versión {version}, "
+          f"{ULTIMA_RECARGA['segundos'] * 1000:.1f} ms")
+    return ULTIMA_RECARGA
+
+
+def _vigilar_personajes(intervalo: float, archivo: str = PERSONAJES_FILE):
+    """Recarga el roster cuando cambia la fecha o el tamaño del archivo."""
+    ruta = ruta_personajes(archivo)
+
+    def firma():
+        try:
+            estado = os.stat(ruta)
+            return estado.st_mtime_ns, estado.st_size
+        except OSError:
+            return None
+
+    anterior = firma()
+    while True:
+        time.sleep(intervalo)
+        actual = firma()
+        if actual is None or actual == anterior:
+            continue
+        anterior = actual
+        try:
+            recargar_catalogo(archivo)
+        except Exception as e:
+            print(f"⚠️ Error recargando personajes: {e}")
+            metricas_manager.registrar_error(str(e), "recarga_personajes")
+
+
+if PERSONAJES_VIGILAR_SEGUNDOS > 0:
+    threading.Thread(target=_vigilar_personajes, args=(PERSONAJES_VIGILAR_SEGUNDOS,),
+                     name='oracle-personajes', daemon=True).start()
+
+
+# ===================================================================
+# GENERADOR DE SUGERENCIAS
+# ===================================================================
+
+class GeneradorSugerencias:
+    SUGERENCIAS_BASE = [
+        "¿Es una persona real?",
+        "¿Es hombre?",
+        "¿Es mujer?",
+        "¿Está vivo actualmente?",
+        "¿Es famoso?",
+        "¿Es rico?",
+        "¿Tiene poderes?",
+        "¿Es científico?",
+        "¿Es artista?",
+        "¿Es escritor?",
+        "¿Es militar?",
+        "¿Es un superhéroe?",
+        "¿Es de Europa?",
+        "¿Es de América?",
+        "¿Es de época antigua?",
+        "¿Es de época moderna?",
+        "¿Pertenece a DC Comics?",
+        "¿Pertenece a Marvel?",
+        "¿Usa gafas?",
+        "¿Tiene barba?",
+        "¿Es mago?",
+        "¿Es detective?",
+        "¿Es un ser imaginario?",
+        "¿Falleció?",
+        "¿Es una figura icónica?",
+        "¿Tiene un arco?",
+        "¿Es inmortal?",
+        "¿Es pacifista?",
+        "¿Es violento?",
+        "¿Es bajo?",
+        "¿Es alto?",
+        "¿Es calvo?",
+        "¿Es de Asia?",
+        "¿Es de África?",
+        "¿Es del futuro?",
+        "¿Es del Señor de los Anillos?",
+        "¿Es de Star Wars?",
+        "¿Es de Harry Potter?"
+    ]
+
+    # Índice palabra -> sugerencias que la contienen y regla Sí/No de cada
+    # sugerencia; se construyen al importar
+    INDICE: Dict[str, Tuple[int, ...]] = {}
+    REGLAS_SUGERENCIA: List[Optional[Regla]] = []
+
+    @staticmethod
+    def indexar():
+        indice = defaultdict(list)
+        for i, sugerencia in enumerate(GeneradorSugerencias.SUGERENCIAS_BASE):
+            for palabra in set(Normalizador.normalizar(sugerencia).split()):
+                indice[palabra].append(i)
+        GeneradorSugerencias.INDICE = {palabra: tuple(indices) for palabra, indices in indice.items()}
+        GeneradorSugerencias.REGLAS_SUGERENCIA = [
+            AnalizadorPreguntas.motor.regla_binaria(Normalizador.normalizar(sugerencia))
+            for sugerencia in GeneradorSugerencias.SUGERENCIAS_BASE
+        ]
+
+    @staticmethod
+    def descartadas_por(pregunta: str) -> set:
+        """Sugerencias que comparten al menos dos palabras con la pregunta (ya preguntadas)."""
+        coincidencias = Counter()
+        for palabra in set(Normalizador.normalizar(pregunta).split()):
+            coincidencias.update(GeneradorSugerencias.INDICE.get(palabra, ()))
+        return {i for i, n in coincidencias.items() if n >= 2}
+
+    @staticmethod
+    def generar(preguntas_hechas: List[str], max_sugerencias: int = 5, descartadas: Optional[set] = None) -> List[str]:
+        """
+        'descartadas' es el conjunto que MemoriaPartida va acumulando pregunta a
+        pregunta; si no se pasa se calcula desde preguntas_hechas.
+        """
+        if descartadas is None:
+            descartadas = set()
+            for pregunta in preguntas_hechas:
+                descartadas |= GeneradorSugerencias.descartadas_por(pregunta)
+        disponibles = []
+        for i, sug in enumerate(GeneradorSugerencias.SUGERENCIAS_BASE):
+            if i in descartadas:
+                continue
+            disponibles.append(sug)
+            if len(disponibles) >= max_sugerencias:
+                break
+        return disponibles
+
+    @staticmethod
+    def inteligentes(memoria: 'MemoriaPartida', max_sugerencias: int = 5) -> List[str]:
+        """
+        Sugerencias ordenadas por ganancia de información sobre los personajes
+        que aún son coherentes con lo respondido. Si no queda ningún candidato
+        (personaje fuera del roster) se vuelve al orden fijo; si ya no hay
+        preguntas que separen (un solo candidato) se completa con ese orden.
+        """
+        matriz = (catalogo_de(memoria.catalogo) or CATALOGO).matriz
+        mascara = matriz.candidatos(memoria.preguntas, memoria.respuestas)
+        if not mascara:
+            return GeneradorSugerencias.generar(memoria.preguntas, max_sugerencias, memoria.sugerencias_descartadas)
+        puntuadas = []
+        vistas = set()
+        for i, regla in enumerate(GeneradorSugerencias.REGLAS_SUGERENCIA):
+            if regla is None or i in memoria.sugerencias_descartadas or regla.id in vistas:
+                continue
+            vistas.add(regla.id)
+            ganancia = matriz.ganancia(mascara, regla)
+            if ganancia > 0:
+                puntuadas.append((-ganancia, i))
+        sugerencias = [GeneradorSugerencias.SUGERENCIAS_BASE[i] for _, i in heapq.nsmallest(max_sugerencias, puntuadas)]
+        if len(sugerencias) < max_sugerencias:
+            for sugerencia in GeneradorSugerencias.generar(memoria.preguntas, max_sugerencias, memoria.sugerencias_descartadas):
+                if len(sugerencias) == max_sugerencias:
+                    break
+                if sugerencia not in sugerencias:
+                    sugerencias.append(sugerencia)
+        return sugerencias
+
+
+GeneradorSugerencias.indexar()
+
+
+# ===================================================================
+# MEMORIA DE PARTIDA
+# ===================================================================
+
+class MemoriaPartida:
+    def __init__(self, personaje_nombre: str, personaje_id: Optional[int] = None, catalogo: Optional[str] = None):
+        self.personaje_nombre = personaje_nombre
+        self.personaje_id = personaje_id
+        self.catalogo = catalogo
+        self.preguntas = []
+        self.respuestas = []
+        self.preguntas_restantes = MAX_PREGUNTAS
+        self.inicio = datetime.now()
+        self.finalizada = False
+        self.sugerencias_descartadas = set()
+
+    def registrar(self, pregunta: str, respuesta: str):
+        self.preguntas.append(pregunta)
+        self.respuestas.append(respuesta)
+        self.sugerencias_descartadas |= GeneradorSugerencias.descartadas_por(pregunta)
+        self.preguntas_restantes -= 1
+        metricas_manager.registrar_pregunta(pregunta)
+
+    def puede_seguir(self) -> bool:
+        return self.preguntas_restantes > 0
+
+    def finalizar(self, ganado: bool):
+        self.finalizada = True
+        metricas_manager.registrar_resultado(self.personaje_nombre, ganado)
+
+    def a_dict(self) -> Dict:
+        return {
+            'personaje_nombre': self.personaje_nombre,
+            'personaje_id': self.personaje_id,
+            'catalogo': self.catalogo,
+            'preguntas': self.preguntas,
+            'respuestas': self.respuestas,
+            'preguntas_restantes': self.preguntas_restantes,
+            'inicio': self.inicio.isoformat(),
+            'finalizada': self.finalizada,
+            'sugerencias_descartadas': sorted(self.sugerencias_descartadas)
+        }
+
+    @classmethod
+    def desde_dict(cls, datos: Dict) -> 'MemoriaPartida':
+        memoria = cls(datos['personaje_nombre'], datos.get('personaje_id'), datos.get('catalogo'))
+        memoria.preguntas = datos['preguntas']
+        memoria.respuestas = datos['respuestas']
+        memoria.preguntas_restantes = datos['preguntas_restantes']
+        memoria.inicio = datetime.fromisoformat(datos['inicio'])
+        memoria.finalizada = datos['finalizada']
+        if 'sugerencias_descartadas' in datos:
+            memoria.sugerencias_descartadas = set(datos['sugerencias_descartadas'])
+        else:
+            for pregunta in memoria.preguntas:
+                memoria.sugerencias_descartadas |= GeneradorSugerencias.descartadas_por(pregunta)
+        return memoria
+
+
+class MemoriaOraculo:
+    """
+    Partida en modo inverso: el jugador piensa un personaje y el Oráculo
+    pregunta. Los candidatos que siguen siendo posibles son una máscara
+    sobre las columnas de la matriz de su versión del catálogo.
+    """
+
+    def __init__(self, catalogo: str, mascara: int):
+        self.catalogo = catalogo
+        self.mascara = mascara
+        self.preguntas = []
+        self.respuestas = []
+        self.pregunta_actual = None
+        self.propuesta = None
+        self.intentos = 0
+        self.preguntas_restantes = MAX_PREGUNTAS
+        self.inicio = datetime.now()
+        self.finalizada = False
+
+    def finalizar(self, ganado: bool):
+        self.finalizada = True
+
+    def a_dict(self) -> Dict:
+        return {
+            'modo': 'oraculo',
+            'catalogo': self.catalogo,
+            'mascara': format(self.mascara, 'x'),
+            'preguntas': self.preguntas,
+            'respuestas': self.respuestas,
+            'pregunta_actual': self.pregunta_actual,
+            'propuesta': self.propuesta,
+            'intentos': self.intentos,
+            'preguntas_restantes': self.preguntas_restantes,
+            'inicio': self.inicio.isoformat(),
+            'finalizada': self.finalizada
+        }
+
+    @classmethod
+    def desde_dict(cls, datos: Dict) -> 'MemoriaOraculo':
+        memoria = cls(datos.get('catalogo'), int(datos['mascara'], 16))
+        memoria.preguntas = datos['preguntas']
+        memoria.respuestas = datos['respuestas']
+        memoria.pregunta_actual = datos['pregunta_actual']
+        memoria.propuesta = datos['propuesta']
+        memoria.intentos = datos['intentos']
+        memoria.preguntas_restantes = datos['preguntas_restantes']
+        memoria.inicio = datetime.fromisoformat(datos['inicio'])
+        memoria.finalizada = datos['finalizada']
+        return memoria
+
+
+def memoria_desde_dict(datos: Dict):
+    """Reconstruye la memoria guardada según el modo de la partida."""
+    if datos.get('modo') == 'oraculo':
+        return MemoriaOraculo.desde_dict(datos)
+    return MemoriaPartida.desde_dict(datos)
+
+
+class AlmacenSesionesBase:
+    """
+    Interfaz de los almacenes de sesiones. obtener() devuelve una
+    MemoriaPartida o MemoriaOraculo (o None si no existe o ha caducado);
+    tras modificarla hay que volver a guardar() para que la vean los demás
+    workers. Una partida desalojada o caducada sin terminar cuenta como
+    perdida.
+    """
+
+    def __init__(self, capacidad: int = SESIONES_MAX, ttl: float = SESIONES_TTL_SEGUNDOS,
+                 barrido: float = SESIONES_BARRIDO_SEGUNDOS):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self._hilo = threading.Thread(target=self._bucle_barrido, args=(barrido,),
+                                      name='oracle-sesiones', daemon=True)
+        self._hilo.start()
+
+    def obtener(self, session_id: str) -> Optional[MemoriaPartida]:
+        raise NotImplementedError
+
+    def guardar(self, session_id: str, memoria: MemoriaPartida):
+        raise NotImplementedError
+
+    def barrer(self):
+        raise NotImplementedError
+
+    def estadisticas(self) -> Dict:
+        raise NotImplementedError
+
+    def _bucle_barrido(self, intervalo: float):
+        while True:
+            time.sleep(intervalo)
+            try:
+                self.barrer()
+            except Exception as e:
+                print(f"⚠️ Error barriendo sesiones: {e}")
+
+    @staticmethod
+    def _cerrar(memorias: List[MemoriaPartida]):
+        # Igual que MemoriaPartida.finalizar: la partida abandonada es una derrota
+        for memoria in memorias:
+            if not memoria.finalizada:
+                memoria.finalizar(False)
+
+
+class AlmacenSesiones(AlmacenSesionesBase):
+    """
+    Sesiones en memoria del proceso con capacidad máxima, expiración por
+    inactividad y desalojo LRU. El OrderedDict se mantiene ordenado por
+    último acceso, así que el barrido solo recorre las sesiones caducadas.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._sesiones: 'OrderedDict[str, Tuple[MemoriaPartida, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.desalojadas = 0
+        self.expiradas = 0
+        super().__init__(*args, **kwargs)
+
+    def obtener(self, session_id: str) -> Optional[MemoriaPartida]:
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._sesiones.get(session_id)
+            if entrada is None:
+                return None
+            memoria, ultimo_uso = entrada
+            if ahora - ultimo_uso > self.ttl:
+                del self._sesiones[session_id]
+                self.expiradas += 1
+                caducada = memoria
+            else:
+                self._sesiones[session_id] = (memoria, ahora)
+                self._sesiones.move_to_end(session_id)
+                return memoria
+        self._cerrar([caducada])
+        return None
+
+    def guardar(self, session_id: str, memoria: MemoriaPartida):
+        desalojadas = []
+        with self._lock:
+            self._sesiones[session_id] = (memoria, time.monotonic())
+            self._sesiones.move_to_end(session_id)
+            while len(self._sesiones) > self.capacidad:
+                _, (antigua, _) = self._sesiones.popitem(last=False)
+                desalojadas.append(antigua)
+            self.desalojadas += len(desalojadas)
+        self._cerrar(desalojadas)
+
+    def barrer(self):
+        limite = time.monotonic() - self.ttl
+        caducadas = []
+        with self._lock:
+            while self._sesiones:
+                session_id, (memoria, ultimo_uso) = next(iter(self._sesiones.items()))
+                if ultimo_uso >= limite:
+                    break
+                del self._sesiones[session_id]
+                caducadas.append(memoria)
+            self.expiradas += len(caducadas)
+        self._cerrar(caducadas)
+
+    def estadisticas(self) -> Dict:
+        return {
+            'activas': len(self._sesiones),
+            'desalojadas': self.desalojadas,
+            'expiradas': self.expiradas,
+            'capacidad': self.capacidad,
+            'ttl_segundos': self.ttl
+        }
+
+
+class AlmacenSesionesSQLite(BaseSQLite, AlmacenSesionesBase):
+    """
+    Sesiones compartidas entre workers en SQLite. Las bajas se hacen con
+    BEGIN IMMEDIATE, así que cada partida abandonada se registra como perdida
+    en un solo worker. La capacidad se aplica en cada barrido.
+    """
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS sesiones (
+            id TEXT PRIMARY KEY, datos TEXT NOT NULL, ultimo_uso REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS sesiones_ultimo_uso ON sesiones (ultimo_uso);
+        CREATE TABLE IF NOT EXISTS contadores (nombre TEXT PRIMARY KEY, valor INTEGER NOT NULL);
+    """
+
+    def __init__(self, ruta: str = ALMACEN_SQLITE, *args, **kwargs):
+        BaseSQLite.__init__(self, ruta)
+        AlmacenSesionesBase.__init__(self, *args, **kwargs)
+
+    def obtener(self, session_id: str) -> Optional[MemoriaPartida]:
+        ahora = time.time()
+        with telemetria.fase('persistencia_sesiones'):
+            fila = self.conexion().execute(
+                "SELECT datos, ultimo_uso FROM sesiones WHERE id = ?", (session_id,)).fetchone()
+        if fila is None:
+            return None
+        if ahora - fila[1] > self.ttl:
+            with self.transaccion() as conexion:
+                borradas = conexion.execute(
+                    "DELETE FROM sesiones WHERE id = ? AND ultimo_uso < ?", (session_id, ahora - self.ttl)).rowcount
+                self._sumar(conexion, 'expiradas', borradas)
+            if borradas:
+                self._cerrar([memoria_desde_dict(json.loads(fila[0]))])
+            return None
+        self.conexion().execute("UPDATE sesiones SET ultimo_uso = ? WHERE id = ?", (ahora, session_id))
+        return memoria_desde_dict(json.loads(fila[0]))
+
+    def guardar(self, session_id: str, memoria: MemoriaPartida):
+        datos = json.dumps(memoria.a_dict(), ensure_ascii=False)
+        with telemetria.fase('persistencia_sesiones'):
+            self.conexion().execute(
+                "INSERT OR REPLACE INTO sesiones (id, datos, ultimo_uso) VALUES (?, ?, ?)",
+                (session_id, datos, time.time()))
 
-        # ---------- NO CLASIFICABLE ----------
-        registrar_hueco(pregunta, personaje, pregunta_norm)
-        return {'answer': 'No lo sé', 'clarification': 'No estoy seguro de cómo interpretar eso. ¿Podrías reformularlo?'}
+    def barrer(self):
+        with self.transaccion() as conexion:
+            caducadas = conexion.execute(
+                "DELETE FROM sesiones WHERE ultimo_uso < ? RETURNING datos", (time.time() - self.ttl,)).fetchall()
+            self._sumar(conexion, 'expiradas', len(caducadas))
+            sobrantes = conexion.execute("SELECT COUNT(*) FROM sesiones").fetchone()[0] - self.capacidad
+            desalojadas = []
+            if sobrantes > 0:
+                desalojadas = conexion.execute(
+                    "DELETE FROM sesiones WHERE id IN (SELECT id FROM sesiones ORDER BY ultimo_uso LIMIT ?) "
+                    "RETURNING datos", (sobrantes,)).fetchall()
+                self._sumar(conexion, 'desalojadas', len(desalojadas))
+        self._cerrar([memoria_desde_dict(json.loads(fila[0])) for fila in caducadas + desalojadas])
+
+    @staticmethod
+    def _sumar(conexion: sqlite3.Connection, contador: str, cantidad: int):
+        if cantidad:
+            conexion.execute(
+                "INSERT INTO contadores (nombre, valor) VALUES (?, ?) "
+                "ON CONFLICT (nombre) DO UPDATE SET valor = valor + excluded.valor", (contador, cantidad))
+
+    def estadisticas(self) -> Dict:
+        conexion = self.conexion()
+        contadores = dict(conexion.execute("SELECT nombre, valor FROM contadores").fetchall())
+        return {
+            'activas': conexion.execute("SELECT COUNT(*) FROM sesiones").fetchone()[0],
+            'desalojadas': contadores.get('desalojadas', 0),
+            'expiradas': contadores.get('expiradas', 0),
+            'capacidad': self.capacidad,
+            'ttl_segundos': self.ttl
+        }
+
+
+sesiones = AlmacenSesionesSQLite() if ALMACEN == 'sqlite' else AlmacenSesiones()
 
 
 # ===================================================================
-# GENERADOR DE SUGERENCIAS
+# MODO ORÁCULO ADIVINO
 # ===================================================================
 
-class GeneradorSugerencias:
-    SUGERENCIAS_BASE = [
-        "¿Es una persona real?",
-        "¿Es hombre?",
-        "¿Es mujer?",
-        "¿Está vivo actualmente?",
-        "¿Es famoso?",
-        "¿Es rico?",
-        "¿Tiene poderes?",
-        "¿Es científico?",
-        "¿Es artista?",
-        "¿Es escritor?",
-        "¿Es militar?",
-        "¿Es un superhéroe?",
-        "¿Es de Europa?",
-        "¿Es de América?",
-        "¿Es de época antigua?",
-        "¿Es de época moderna?",
-        "¿Pertenece a DC Comics?",
-        "¿Pertenece a Marvel?",
-        "¿Usa gafas?",
-        "¿Tiene barba?",
-        "¿Es mago?",
-        "¿Es detective?",
-        "¿Es un ser imaginario?",
-        "¿Falleció?",
-        "¿Es una figura icónica?",
-        "¿Tiene un arco?",
-        "¿Es inmortal?",
-        "¿Es pacifista?",
-        "¿Es violento?",
-        "¿Es bajo?",
-        "¿Es alto?",
-        "¿Es calvo?",
-        "¿Es de Asia?",
-        "¿Es de África?",
-        "¿Es del futuro?",
-        "¿Es del Señor de los Anillos?",
-        "¿Es de Star Wars?",
-        "¿Es de Harry Potter?"
-    ]
+class OraculoAdivino:
+    """
+    El Oráculo adivina: en cada turno elige, entre las reglas con hecho, la
+    pregunta de mayor ganancia de información sobre los candidatos que
+    quedan (MatrizRespuestas.ganancia) y filtra la máscara con la respuesta.
+    Cuando queda un candidato o ninguna pregunta los separa, lo propone.
+    """
+
+    # Una pregunta por regla: el texto se resuelve con la misma regla (regla_binaria)
+    PREGUNTAS = {
+        'tipo_real': "¿Es una persona real?",
+        'tipo_ficticio': "¿Es un personaje ficticio?",
+        'genero_masculino': "¿Es hombre?",
+        'genero_femenino': "¿Es mujer?",
+        'vivo': "¿Está vivo actualmente?",
+        'muerto': "¿Ha muerto?",
+        'famoso': "¿Es famoso?",
+        'conocido_mundial': "¿Lo conoce todo el mundo?",
+        'rico': "¿Es rico?",
+        'pobre': "¿Es pobre?",
+        'cientifico': "¿Es científico?",
+        'artista': "¿Es artista?",
+        'escritor': "¿Es escritor?",
+        'militar': "¿Es militar?",
+        'mago': "¿Es mago o bruja?",
+        'superheroe': "¿Es un superhéroe?",
+        'villano': "¿Es un villano?",
+        'detective': "¿Es detective?",
+        'dramaturgo': "¿Es dramaturgo?",
+        'inventor': "¿Es inventor?",
+        'presidente': "¿Fue presidente?",
+        'escultor': "¿Es escultor?",
+        'europa': "¿Es de Europa?",
+        'america': "¿Es de América?",
+        'asia': "¿Es de Asia?",
+        'aleman': "¿Es alemán?",
+        'frances': "¿Es francés?",
+        'ingles': "¿Es inglés?",
+        'italiano': "¿Es italiano?",
+        'espanol': "¿Es español?",
+        'polaco': "¿Es polaco?",
+        'chino': "¿Es chino?",
+        'mexicano': "¿Es mexicano?",
+        'estadounidense': "¿Es estadounidense?",
+        'epoca_antigua': "¿Es de la época antigua?",
+        'epoca_medieval': "¿Es de la Edad Media?",
+        'epoca_renacimiento': "¿Es del Renacimiento?",
+        'epoca_moderna': "¿Es de la época moderna?",
+        'epoca_futuro': "¿Es del futuro?",
+        'antes_de_cristo': "¿Vivió antes de Cristo?",
+        'universo_dc': "¿Pertenece a DC Comics?",
+        'universo_marvel': "¿Pertenece a Marvel?",
+        'universo_harry_potter': "¿Es de Harry Potter?",
+        'universo_star_wars': "¿Es de Star Wars?",
+        'universo_tolkien': "¿Es del Señor de los Anillos?",
+        'gafas': "¿Lleva gafas?",
+        'barba': "¿Tiene barba?",
+        'calvo': "¿Es calvo?",
+        'alto': "¿Es alto?",
+        'bajo': "¿Es bajo?",
+        'poderes': "¿Tiene poderes?",
+        'vuela': "¿Puede volar?",
+        'inmortal': "¿Es inmortal?",
+        'fuerza_sobrehumana': "¿Tiene fuerza sobrehumana?",
+        'habilidades_especiales': "¿Tiene habilidades especiales?",
+        'arco': "¿Tiene un arco?",
+        'espada': "¿Lleva espada?",
+        'porta_armas': "¿Porta armas?",
+        'gadgets': "¿Tiene gadgets?",
+        'tecnologia_avanzada': "¿Emplea tecnología avanzada?",
+        'nobel': "¿Ganó un premio Nobel?",
+        'premios': "¿Ha recibido algún premio?",
+        'revoluciono': "¿Revolucionó su campo?",
+        'cambio_historia': "¿Cambió la historia?",
+        'descubrimientos': "¿Hizo descubrimientos?",
+        'violento': "¿Es violento?",
+        'pacifista': "¿Es pacifista?",
+        'conquistador': "¿Fue conquistador?",
+        'imperialista': "¿Es imperialista?",
+        'lucho_libertad': "¿Luchó por la libertad?",
+        'lider': "¿Es un líder?",
+        'gobernante': "¿Fue gobernante?",
+        'general': "¿Fue general?",
+        'antagonista': "¿Es antagonista?",
+        'liberal': "¿Es liberal?",
+        'conservador': "¿Es conservador?",
+        'iconico': "¿Es una figura icónica?",
+    }
+
+    RESPUESTAS_SI = {'si', 's', 'yes', 'y', 'true', '1'}
+    RESPUESTAS_NO = {'no', 'n', 'false', '0'}
 
     @staticmethod
-    def generar(preguntas_hechas: List[str], max_sugerencias: int = 5) -> List[str]:
-        preguntas_norm = [Normalizador.normalizar(p) for p in preguntas_hechas]
-        disponibles = []
-        for sug in GeneradorSugerencias.SUGERENCIAS_BASE:
-            sug_norm = Normalizador.normalizar(sug)
-            ya_preguntada = False
-            for p_norm in preguntas_norm:
-                palabras_sug = set(sug_norm.split())
-                palabras_preg = set(p_norm.split())
-                if len(palabras_sug & palabras_preg) >= 2:
-                    ya_preguntada = True
-                    break
-            if not ya_preguntada:
-                disponibles.append(sug)
-            if len(disponibles) >= max_sugerencias * 2:
-                break
-        return disponibles[:max_sugerencias]
+    def interpretar(respuesta) -> Optional[bool]:
+        """True/False para Sí/No; None si el jugador no lo sabe."""
+        if isinstance(respuesta, bool):
+            return respuesta
+        texto = Normalizador.normalizar(str(respuesta)).strip()
+        if texto in OraculoAdivino.RESPUESTAS_SI:
+            return True
+        if texto in OraculoAdivino.RESPUESTAS_NO:
+            return False
+        return None
+
+    @staticmethod
+    def mejor_pregunta(memoria: MemoriaOraculo, matriz: MatrizRespuestas) -> Tuple[Optional[Regla], float]:
+        hechas = set(memoria.preguntas)
+        mejor, mejor_ganancia = None, 0.0
+        for regla in OraculoAdivino.BANCO:
+            if regla.id in hechas:
+                continue
+            ganancia = matriz.ganancia(memoria.mascara, regla)
+            if ganancia > mejor_ganancia:
+                mejor, mejor_ganancia = regla, ganancia
+        return mejor, mejor_ganancia
+
+    @staticmethod
+    def siguiente(memoria: MemoriaOraculo, catalogo: CatalogoPersonajes) -> Dict:
+        """Decide el siguiente paso: preguntar, proponer un personaje o rendirse."""
+        memoria.pregunta_actual = None
+        memoria.propuesta = None
+        candidatos = memoria.mascara.bit_count()
+        if candidatos == 0 or memoria.intentos >= ORACULO_MAX_INTENTOS:
+            memoria.finalizar(False)
+            return {'rendido': True, 'candidatos': candidatos,
+                    'message': 'Me rindo. No sé en quién estás pensando.'}
+
+        regla = None
+        if candidatos > 1 and memoria.preguntas_restantes > 0:
+            regla, _ = OraculoAdivino.mejor_pregunta(memoria, catalogo.matriz)
+        if regla is not None:
+            memoria.pregunta_actual = regla.id
+            return {'question': OraculoAdivino.PREGUNTAS[regla.id], 'question_id': regla.id,
+                    'preguntas_restantes': memoria.preguntas_restantes, 'candidatos': candidatos}
+
+        # El candidato de índice más bajo: el primero del roster que encaja
+        memoria.propuesta = (memoria.mascara & -memoria.mascara).bit_length() - 1
+        return {'guess': catalogo.matriz.vectores[memoria.propuesta].nombre, 'candidatos': candidatos}
+
+    @staticmethod
+    def responder(memoria: MemoriaOraculo, catalogo: CatalogoPersonajes, respuesta) -> Dict:
+        if memoria.finalizada:
+            return {'error': 'La partida ya ha terminado'}
+        if memoria.pregunta_actual is None:
+            return {'error': 'No hay ninguna pregunta pendiente'}
+        regla = AnalizadorPreguntas.motor.por_id[memoria.pregunta_actual]
+        si = OraculoAdivino.interpretar(respuesta)
+        if si is not None:
+            memoria.mascara = catalogo.matriz.filtrar(memoria.mascara, regla, si)
+        memoria.preguntas.append(regla.id)
+        memoria.respuestas.append('No lo sé' if si is None else ('Sí' if si else 'No'))
+        memoria.preguntas_restantes -= 1
+        return OraculoAdivino.siguiente(memoria, catalogo)
+
+    @staticmethod
+    def confirmar(memoria: MemoriaOraculo, catalogo: CatalogoPersonajes, correcto: bool) -> Dict:
+        if memoria.finalizada:
+            return {'error': 'La partida ya ha terminado'}
+        if memoria.propuesta is None:
+            return {'error': 'No hay ninguna propuesta pendiente'}
+        nombre = catalogo.matriz.vectores[memoria.propuesta].nombre
+        if correcto:
+            memoria.finalizar(True)
+            return {'correct': True, 'character': nombre,
+                    'message': f'¡Lo sabía! Estabas pensando en {nombre}.'}
+        memoria.intentos += 1
+        memoria.mascara &= ~(1 << memoria.propuesta)
+        return OraculoAdivino.siguiente(memoria, catalogo)
+
+
+OraculoAdivino.BANCO = [regla for regla in AnalizadorPreguntas.motor.con_hecho
+                        if regla.id in OraculoAdivino.PREGUNTAS]
 
 
 # ===================================================================
-# MEMORIA DE PARTIDA
+# TELEMETRÍA HTTP
 # ===================================================================
 
-class MemoriaPartida:
-    def __init__(self, personaje_nombre: str):
-        self.personaje_nombre = personaje_nombre
-        self.preguntas = []
-        self.respuestas = []
-        self.preguntas_restantes = MAX_PREGUNTAS
-        self.inicio = datetime.now()
+ACCIONES_ORACLE = frozenset(('start', 'ask', 'guess', 'suggestions', 'hint',
+                             'oracle_start', 'oracle_answer', 'oracle_confirm'))
 
-    def registrar(self, pregunta: str, respuesta: str):
-        self.preguntas.append(pregunta)
-        self.respuestas.append(respuesta)
-        self.preguntas_restantes -= 1
-        metricas_manager.registrar_pregunta(pregunta)
 
-    def puede_seguir(self) -> bool:
-        return self.preguntas_restantes > 0
+@app.before_request
+def telemetria_inicio():
+    g.telemetria_inicio = time.perf_counter()
+
+
+@app.after_request
+def telemetria_fin(respuesta):
+    inicio = g.pop('telemetria_inicio', None)
+    if inicio is None or not telemetria.activa:
+        return respuesta
+    segundos = time.perf_counter() - inicio
+    # La regla de la ruta (no la URL) y las acciones conocidas mantienen acotado el número de series
+    endpoint = request.url_rule.rule if request.url_rule else 'sin_ruta'
+    telemetria.observar('oracle_peticion_segundos', segundos, endpoint=endpoint)
+    telemetria.contar('oracle_peticiones_total', endpoint=endpoint, metodo=request.method,
+                      estado=str(respuesta.status_code))
+    if respuesta.status_code >= 500:
+        telemetria.contar('oracle_errores_total', endpoint=endpoint)
+    if endpoint == '/api/oracle':
+        accion = g.get('accion')
+        telemetria.observar('oracle_accion_segundos', segundos,
+                            accion=accion if accion in ACCIONES_ORACLE else 'otra')
+    return respuesta
 
-    def finalizar(self, ganado: bool):
-        metricas_manager.registrar_resultado(self.personaje_nombre, ganado)
 
-memorias = {}
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    respuesta = make_response(telemetria.prometheus())
+    respuesta.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return respuesta
 
 
 # ===================================================================
@@ -652,64 +3609,122 @@ memorias = {}
 analizador = AnalizadorPreguntas()
 generador = GeneradorSugerencias()
 
+
+class PartidaNoEncontrada(Exception):
+    pass
+
+
+def resolver_partida(data: Dict) -> Tuple[str, Optional[MemoriaPartida], Dict]:
+    """
+    (clave de sesión, memoria, personaje) de una petición. Con 'game_token'
+    el personaje sale del roster del servidor; sin él (modo legacy) es el
+    que manda el cliente en 'character'.
+    """
+    token = data.get('game_token')
+    if token:
+        memoria = sesiones.obtener(token)
+        personaje = personaje_de_partida(memoria) if isinstance(memoria, MemoriaPartida) else None
+        if personaje is None:
+            raise PartidaNoEncontrada()
+        return token, memoria, personaje
+    if not PERSONAJE_CLIENTE:
+        raise PartidaNoEncontrada()
+    session_id = data.get('session_id', 'default')
+    return session_id, sesiones.obtener(session_id), data.get('character', {})
+
+
 @app.route('/api/oracle', methods=['POST'])
 def oracle():
+    action = None
     try:
-        data = request.get_json()
-        action = data.get('action')
-        session_id = data.get('session_id', 'default')
+        data = de_json(request.get_data())
+        action = g.accion = data.get('action')
 
         if action == 'start':
-            character = random.choice(PERSONAJES)
-            memorias[session_id] = MemoriaPartida(character['nombre'])
+            catalogo = CATALOGO
+            posicion = random.randrange(len(catalogo))
+            character = catalogo.personajes[posicion]
             metricas_manager.registrar_partida_iniciada(character['nombre'])
-            return jsonify({
-                'character': character,
-                'message': 'Juego iniciado',
-                'session_id': session_id
-            })
+            memoria = MemoriaPartida(character['nombre'], character.get('_id'), catalogo.version)
+            if data.get('modo') == 'token' or not PERSONAJE_CLIENTE:
+                token = secrets.token_urlsafe(16)
+                sesiones.guardar(token, memoria)
+                return respuesta_json({'game_token': token, 'message': 'Juego iniciado'})
+            session_id = data.get('session_id', 'default')
+            sesiones.guardar(session_id, memoria)
+            # El personaje va tal cual se serializó al cargar el roster
+            return respuesta_json(b'{"character":' + catalogo.serializado(posicion) +
+                                  b',"message":"Juego iniciado","session_id":' + a_json(session_id) + b'}')
+
+        if action == 'oracle_start':
+            token = secrets.token_urlsafe(16)
+            catalogo = CATALOGO
+            memoria = MemoriaOraculo(catalogo.version, catalogo.matriz.todos)
+            paso = OraculoAdivino.siguiente(memoria, catalogo)
+            sesiones.guardar(token, memoria)
+            return respuesta_json({'game_token': token, 'message': 'Piensa en un personaje', **paso})
+
+        if action in ('oracle_answer', 'oracle_confirm'):
+            token = data.get('game_token')
+            memoria = sesiones.obtener(token) if token else None
+            catalogo = catalogo_de(memoria.catalogo) if isinstance(memoria, MemoriaOraculo) else None
+            if catalogo is None:
+                raise PartidaNoEncontrada()
+            if action == 'oracle_answer':
+                paso = OraculoAdivino.responder(memoria, catalogo, data.get('answer'))
+            else:
+                paso = OraculoAdivino.confirmar(memoria, catalogo, OraculoAdivino.interpretar(data.get('correct')) is True)
+            sesiones.guardar(token, memoria)
+            return respuesta_json(paso, 400 if 'error' in paso else 200)
+
+        session_id, memoria, character = resolver_partida(data)
 
-        elif action == 'ask':
+        if action == 'ask':
             question = data.get('question', '').strip()
-            character = data.get('character', {})
             if not question:
-                return jsonify({'answer': 'No lo sé', 'clarification': ''})
+                return respuesta_json({'answer': 'No lo sé', 'clarification': ''})
 
-            if session_id not in memorias:
-                memorias[session_id] = MemoriaPartida(character.get('nombre', 'desconocido'))
-            memoria = memorias[session_id]
+            if memoria is None:
+                memoria = MemoriaPartida(character.get('nombre', 'desconocido'), character.get('_id'))
+                sesiones.guardar(session_id, memoria)
 
             if not memoria.puede_seguir():
-                memoria.finalizar(False)
-                return jsonify({'answer': 'Has agotado tus preguntas. Debes adivinar.', 'clarification': ''})
+                if not memoria.finalizada:
+                    memoria.finalizar(False)
+                    sesiones.guardar(session_id, memoria)
+                return respuesta_json({'answer': 'Has agotado tus preguntas. Debes adivinar.', 'clarification': ''})
 
-            respuesta = analizador.analizar(question, character)
-            if respuesta['answer'] == 'No lo sé':
-                registrar_hueco(question, character, Normalizador.normalizar(question))
+            # Con la versión del roster de la partida, como hint, sugerencias y lote
+            respuesta = analizador.analizar(question, character, catalogo_de(memoria.catalogo))
             memoria.registrar(question, respuesta['answer'])
-            return jsonify(respuesta)
+            sesiones.guardar(session_id, memoria)
+            return respuesta_json(respuesta)
 
         elif action == 'guess':
-            guess = data.get('guess', '').lower().strip()
-            character = data.get('character', {})
-            character_name = character.get('nombre', '').lower().strip()
-            guess_norm = Normalizador.normalizar(guess)
-            name_norm = Normalizador.normalizar(character_name)
-            correct = guess_norm == name_norm
-            if session_id in memorias:
-                memorias[session_id].finalizar(correct)
-            return jsonify({'correct': correct, 'character': character['nombre']})
+            # Contra la versión del roster de la partida, igual que ask
+            catalogo = (catalogo_de(memoria.catalogo) or CATALOGO) if memoria is not None else CATALOGO
+            correct, coincidencia = catalogo.evaluar_intento(character, data.get('guess', ''))
+            # Reintentos sobre una partida ya terminada no vuelven a contar el resultado
+            if memoria is not None and not memoria.finalizada:
+                memoria.finalizar(correct)
+                sesiones.guardar(session_id, memoria)
+            return respuesta_json({
+                'correct': correct,
+                'character': character['nombre'],
+                'match': coincidencia['nombre'] if coincidencia else None,
+                'score': coincidencia['score'] if coincidencia else 0.0
+            })
 
         elif action == 'suggestions':
-            if session_id in memorias:
-                preguntas_hechas = memorias[session_id].preguntas
+            if memoria is not None and data.get('modo') == 'inteligente':
+                suggestions = generador.inteligentes(memoria, 5)
+            elif memoria is not None:
+                suggestions = generador.generar(memoria.preguntas, 5, memoria.sugerencias_descartadas)
             else:
-                preguntas_hechas = []
-            suggestions = generador.generar(preguntas_hechas, 5)
-            return jsonify({'suggestions': suggestions})
+                suggestions = generador.generar([], 5)
+            return respuesta_json({'suggestions': suggestions})
 
         elif action == 'hint':
-            character = data.get('character', {})
             hint_level = data.get('hint_level', 1)
             pistas = character.get('pistas', [])
             if hint_level == 1 and len(pistas) > 0:
@@ -718,17 +3733,120 @@ def oracle():
                 hint = pistas[1]
             else:
                 hint = "No hay más pistas disponibles."
-            return jsonify({'hint': hint})
+            return respuesta_json({'hint': hint})
 
         else:
-            return jsonify({'error': 'Acción no válida'}), 400
+            return respuesta_json({'error': 'Acción no válida'}, 400)
 
+    except PartidaNoEncontrada:
+        return respuesta_json({'error': 'Partida no encontrada o expirada'}, 404)
     except Exception as e:
         print(f"❌ Error: {e}")
         metricas_manager.registrar_error(str(e), f"oracle_endpoint_{action}")
         import traceback
         traceback.print_exc()
-        return jsonify({'error': str(e)}), 500
+        return respuesta_json({'error': str(e)}, 500)
+
+
+# ===================================================================
+# EVALUACIÓN POR LOTES
+# ===================================================================
+
+BITS_A_CODIGOS = str.maketrans('10', 'SN')
+
+
+def codigo_respuesta(respuesta: Optional[Dict]) -> str:
+    if respuesta is None:
+        return '-'
+    return {'Sí': 'S', 'No': 'N'}.get(respuesta['answer'], '*')
+
+
+def evaluar_lote(preguntas: List[str], ids: Optional[List], catalogo: CatalogoPersonajes) -> Dict:
+    """
+    Matriz preguntas × personajes sin tocar sesiones, métricas, huecos ni la
+    caché de respuestas. Cada pregunta se normaliza una vez; si la resuelve
+    una regla Sí/No, la fila sale entera de la columna de la matriz. Solo las
+    reglas que dependen del personaje (siglo) se evalúan uno a uno.
+    Cada fila es un texto con una letra por personaje: S (Sí), N (No),
+    - (sin clasificar: sería un hueco) o * (otra respuesta, que va en
+    'otras' como [fila, columna, texto]).
+    """
+    motor = AnalizadorPreguntas.motor
+    vectores = catalogo.matriz.vectores
+    indice = catalogo.indice_matriz()
+    if ids is None:
+        columnas = list(range(len(vectores)))
+        desconocidos = []
+    else:
+        columnas = [indice[i] for i in ids if i in indice]
+        desconocidos = [i for i in ids if i not in indice]
+    completa = len(columnas) == len(vectores) and columnas == list(range(len(vectores)))
+
+    detalle, filas, otras = [], [], []
+    for fila, pregunta in enumerate(preguntas):
+        pregunta_norm = Normalizador.normalizar(pregunta)
+        texto, regla = pregunta_norm, None
+        if not ANALIZADOR_LEGACY:
+            texto, regla = AnalizadorPreguntas.lemas.regla_binaria(pregunta_norm)
+        if regla is not None:
+            bits = format(catalogo.matriz.columnas[regla.bit], 'b').zfill(len(vectores))[::-1]
+            if not completa:
+                bits = ''.join([bits[j] for j in columnas])
+            filas.append(bits.translate(BITS_A_CODIGOS))
+        elif not ANALIZADOR_LEGACY and not motor.candidatas(texto):
+            filas.append('-' * len(columnas))
+        else:
+            codigos = []
+            for columna, j in enumerate(columnas):
+                personaje = catalogo.por_id[vectores[j].id] if ANALIZADOR_LEGACY else None
+                respuesta = AnalizadorPreguntas.resolver(pregunta_norm, personaje, vectores[j])
+                codigo = codigo_respuesta(respuesta)
+                if codigo == '*':
+                    otras.append([fila, columna, respuesta['answer']])
+                codigos.append(codigo)
+            filas.append(''.join(codigos))
+        detalle.append({'normalizada': pregunta_norm, 'regla': regla.id if regla else None})
+
+    return {
+        'version': catalogo.version,
+        'ids': [vectores[j].id for j in columnas],
+        'desconocidos': desconocidos,
+        'preguntas': detalle,
+        'respuestas': filas,
+        'otras': otras
+    }
+
+
+@app.route('/api/oracle/batch', methods=['POST'])
+def oracle_batch():
+    try:
+        data = de_json(request.get_data())
+        if not isinstance(data, dict):
+            return respuesta_json({'error': 'El cuerpo debe ser un objeto JSON'}, 400)
+        preguntas = data.get('questions')
+        ids = data.get('ids')
+        version = data.get('version')
+        if not isinstance(preguntas, list) or not all(isinstance(p, str) for p in preguntas):
+            return respuesta_json({'error': "'questions' debe ser una lista de textos"}, 400)
+        # Solo escalares: un elemento no hashable rompería la búsqueda en el índice
+        if ids is not None and (not isinstance(ids, list) or
+                                not all(isinstance(i, (int, str)) and not isinstance(i, bool) for i in ids)):
+            return respuesta_json({'error': "'ids' debe ser una lista de _id (enteros o textos)"}, 400)
+        if version is not None and (not isinstance(version, (int, str)) or isinstance(version, bool)):
+            return respuesta_json({'error': "'version' debe ser un identificador de versión (texto o número)"}, 400)
+        # None = roster vigente; cualquier otro valor (también 0 o "") tiene que ser una versión retenida
+        catalogo = catalogo_de(version) if version is not None else CATALOGO
+        if catalogo is None:
+            return respuesta_json({'error': 'Versión del roster no disponible'}, 404)
+        celdas = len(preguntas) * (len(catalogo) if ids is None else len(ids))
+        if len(preguntas) > LOTE_MAX_PREGUNTAS or celdas > LOTE_MAX_CELDAS:
+            return respuesta_json({'error': f'Lote demasiado grande: máximo {LOTE_MAX_PREGUNTAS} preguntas '
+                                            f'y {LOTE_MAX_CELDAS} celdas'}, 400)
+        return respuesta_json(evaluar_lote(preguntas, ids, catalogo))
+    except Exception as e:
+        # Sin registrar_error: el lote no debe dejar rastro en las métricas del juego
+        print(f"❌ Error en lote: {e}")
+        return respuesta_json({'error': str(e)}, 500)
 
 
 # ===================================================================
@@ -739,6 +3857,16 @@ def oracle():
 def dashboard_stats():
     try:
         stats = metricas_manager.obtener_estadisticas()
+        stats['sesiones'] = sesiones.estadisticas()
+        stats['catalogo'] = {
+            'version': CATALOGO.version,
+            'personajes': len(CATALOGO),
+            'versiones_retenidas': len(CATALOGOS),
+            'ultima_recarga': ULTIMA_RECARGA
+        }
+        stats['rendimiento'] = telemetria.resumen()
+        stats['persistencia'] = persistencia.estadisticas()
+        stats['cache_respuestas'] = AnalizadorPreguntas.cache.estadisticas()
         return jsonify(stats)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -747,30 +3875,31 @@ def dashboard_stats():
 def dashboard_huecos():
     try:
         limit = request.args.get('limit', 50, type=int)
-        if os.path.exists(REGISTRO_HUECOS_FILE):
-            with open(REGISTRO_HUECOS_FILE, 'r', encoding='utf-8') as f:
-                huecos = json.load(f)
-            preguntas_counter = Counter([h['pregunta_normalizada'] for h in huecos])
-            personajes_counter = Counter([h['personaje'] for h in huecos])
-            return jsonify({
-                'total': len(huecos),
-                'ultimos': huecos[-limit:],
-                'preguntas_frecuentes': preguntas_counter.most_common(20),
-                'personajes_problematicos': personajes_counter.most_common(10)
-            })
-        else:
-            return jsonify({'total': 0, 'ultimos': [], 'preguntas_frecuentes': [], 'personajes_problematicos': []})
+        return jsonify({
+            'total': registro_huecos.total(),
+            'ultimos': registro_huecos.ultimos(limit),
+            'preguntas_frecuentes': registro_huecos.top_preguntas(20),
+            'personajes_problematicos': registro_huecos.top_personajes(10)
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/dashboard/personajes', methods=['GET'])
 def dashboard_personajes():
     try:
+        catalogo = CATALOGO
+        # Solo atributos indexados: un parámetro desconocido no debe vaciar la lista en silencio
+        desconocidos = sorted(atributo for atributo in request.args if atributo not in catalogo.indices)
+        if desconocidos:
+            return jsonify({'error': f"Filtros desconocidos: {', '.join(desconocidos)}",
+                            'filtros_validos': sorted(catalogo.indices)}), 400
+        metricas = metricas_manager.vista()
         personajes_stats = []
-        for p in PERSONAJES:
+        filtros = {atributo: CatalogoPersonajes.valor_consulta(valor) for atributo, valor in request.args.items()}
+        for p in catalogo.filtrar(filtros):
             nombre = p['nombre']
-            veces_usado = metricas_manager.metricas['personajes_usados'].get(nombre, 0)
-            tasa_exito = metricas_manager.metricas['tasa_exito_por_personaje'].get(nombre, {"ganadas": 0, "perdidas": 0})
+            veces_usado = metricas['personajes_usados'].get(nombre, 0)
+            tasa_exito = metricas['tasa_exito_por_personaje'].get(nombre, {"ganadas": 0, "perdidas": 0})
             total_partidas = tasa_exito['ganadas'] + tasa_exito['perdidas']
             porcentaje = round(tasa_exito['ganadas'] / total_partidas * 100, 2) if total_partidas > 0 else 0
             personajes_stats.append({
@@ -782,7 +3911,7 @@ def dashboard_personajes():
                 'porcentaje_victoria': porcentaje
             })
         personajes_stats.sort(key=lambda x: x['veces_usado'], reverse=True)
-        return jsonify({'personajes': personajes_stats, 'total_personajes': len(PERSONAJES)})
+        return jsonify({'personajes': personajes_stats, 'total_personajes': len(catalogo)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -790,23 +3919,15 @@ def dashboard_personajes():
 def dashboard_errores():
     try:
         limit = request.args.get('limit', 50, type=int)
-        errores = metricas_manager.metricas.get('errores', [])
+        errores = metricas_manager.vista().get('errores', [])
         return jsonify({'total': len(errores), 'ultimos': errores[-limit:]})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/dashboard/exportar-txt', methods=['GET'])
 def exportar_txt():
-    try:
-        with open(METRICAS_FILE, 'r', encoding='utf-8') as f:
-            metricas = json.load(f)
-    except:
-        metricas = {}
-    try:
-        with open(REGISTRO_HUECOS_FILE, 'r', encoding='utf-8') as f:
-            huecos = json.load(f)
-    except:
-        huecos = []
+    metricas = metricas_manager.vista()
+    huecos_recientes = registro_huecos.ultimos(50)
 
     output = StringIO()
     output.write("=" * 80 + "\n")
@@ -836,20 +3957,23 @@ def exportar_txt():
         output.write(f"{i:2d}. {nombre:30s} - {veces:3d} veces\n")
     output.write("\n")
 
+    output.write(f"PREGUNTAS MÁS HECHAS (Top {PREGUNTAS_FRECUENTES_TOP})\n")
+    output.write("-" * 80 + "\n")
+    for i, (pregunta, veces) in enumerate(metricas['preguntas_frecuentes'].top(PREGUNTAS_FRECUENTES_TOP), 1):
+        output.write(f"{i:2d}. [{veces:3d}x] {pregunta}\n")
+    output.write("\n")
+
     output.write("ANÁLISIS DE HUECOS\n")
     output.write("-" * 80 + "\n")
-    output.write(f"Total de Huecos: {len(huecos)}\n\n")
-    from collections import Counter
-    preguntas_counter = Counter([h['pregunta_normalizada'] for h in huecos])
+    output.write(f"Total de Huecos: {registro_huecos.total()}\n\n")
     output.write("Top 30 Preguntas Más Frecuentes (Sin Respuesta):\n")
     output.write("-" * 80 + "\n")
-    for i, (pregunta, cantidad) in enumerate(preguntas_counter.most_common(30), 1):
+    for i, (pregunta, cantidad) in enumerate(registro_huecos.top_preguntas(30), 1):
         output.write(f"{i:2d}. [{cantidad:3d}x] {pregunta}\n")
     output.write("\n")
-    personajes_counter = Counter([h['personaje'] for h in huecos])
     output.write("Top 15 Personajes con Más Huecos:\n")
     output.write("-" * 80 + "\n")
-    for i, (personaje, cantidad) in enumerate(personajes_counter.most_common(15), 1):
+    for i, (personaje, cantidad) in enumerate(registro_huecos.top_personajes(15), 1):
         output.write(f"{i:2d}. {personaje:30s} - {cantidad:3d} huecos\n")
     output.write("\n")
 
@@ -857,7 +3981,7 @@ def exportar_txt():
     output.write("-" * 80 + "\n")
     output.write(f"{'Fecha/Hora':<20} {'Personaje':<25} {'Pregunta':<35}\n")
     output.write("-" * 80 + "\n")
-    for hueco in reversed(huecos[-50:]):
+    for hueco in reversed(huecos_recientes):
         timestamp = hueco.get('timestamp', '')[:19]
         personaje = hueco.get('personaje', '')[:24]
         pregunta = hueco.get('pregunta_original', '')[:34]
@@ -873,6 +3997,26 @@ def exportar_txt():
     return response
 
 
+# ===================================================================
+# ADMINISTRACIÓN
+# ===================================================================
+
+def admin_autorizado() -> bool:
+    """Sin ORACLE_ADMIN_TOKEN los endpoints de administración quedan abiertos, como el dashboard."""
+    return not ADMIN_TOKEN or secrets.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+
+
+@app.route('/api/admin/recargar-personajes', methods=['POST'])
+def recargar_personajes():
+    if not admin_autorizado():
+        return jsonify({'error': 'No autorizado'}), 403
+    try:
+        return jsonify(recargar_catalogo())
+    except Exception as e:
+        metricas_manager.registrar_error(str(e), "recarga_personajes")
+        return jsonify({'error': str(e)}), 400
+
+
 # ===================================================================
 # DASHBOARD HTML
 # ===================================================================
@@ -1092,6 +4236,11 @@ DASHBOARD_HTML = '''
                     <div class="stat-label">Preguntas Totales</div>
                     <div class="stat-value" id="stat-preguntas">-</div>
                 </div>
+                <div class="stat-card">
+                    <div class="stat-label">Sesiones Activas</div>
+                    <div class="stat-value" id="stat-sesiones">-</div>
+                    <div class="stat-label" id="stat-sesiones-detalle"></div>
+                </div>
             </div>
             <div class="section">
                 <h2>🎯 Personajes Más Jugados</h2>
@@ -1182,6 +4331,10 @@ DASHBOARD_HTML = '''
                 document.getElementById('stat-ganadas').textContent = data.partidas_ganadas;
                 document.getElementById('stat-tasa').textContent = data.tasa_victoria + '%';
                 document.getElementById('stat-preguntas').textContent = data.preguntas_totales;
+                if (data.sesiones) {
+                    document.getElementById('stat-sesiones').textContent = data.sesiones.activas;
+                    document.getElementById('stat-sesiones-detalle').textContent = `${data.sesiones.expiradas} expiradas · ${data.sesiones.desalojadas} desalojadas`;
+                }
 
                 const tbody1 = document.querySelector('#table-mas-usados tbody');
                 tbody1.innerHTML = (data.personajes_mas_usados || []).map((p, i) => `<tr><td>${i+1}</td><td>${p[0]}</td><td>${p[1]}</td></tr>`).join('') || '<tr><td colspan="3">No hay datos</td></tr>';
@@ -1267,7 +4420,7 @@ def dashboard():
 def health():
     return jsonify({
         'status': 'ok',
-        'personajes': len(PERSONAJES),
+        'personajes': len(CATALOGO),
         'mensaje': '🧠 The Oracle - Con Dashboard de Métricas'
     })
 
@@ -1278,7 +4431,7 @@ def home():
     <head><title>The Oracle</title></head>
     <body style="font-family:sans-serif; background:#000; color:#0f0; padding:20px; text-align:center;">
         <h1 style="color:#ff00ff;">🧠 THE ORACLE</h1>
-        <p>{len(PERSONAJES)} Personajes | Sistema HÍBRIDO</p>
+        <p>{len(CATALOGO)} Personajes | Sistema HÍBRIDO</p>
         <p>✅ Respuestas CORRECTAS</p>
         <p>✅ Sugerencias ÚTILES</p>
         <p>✅ Panel de Control Activo</p>
@@ -1289,16 +4442,606 @@ def home():
     """
 
 
+# ===================================================================
+# BENCHMARKS
+# ===================================================================
+
+PREGUNTAS_EJEMPLO = [
+    "¿Es hombre?", "¿es mujer?", "Es real?", "¿Está vivo?", "¿Es un personaje ficticio?",
+    "¿Es de Marvel?", "¿Usa gafas?", "¿Tiene barba?", "¿Es del siglo 20?", "¿Ganó el premio Nobel?",
+    "¿Es europeo?", "¿Es científico?", "¿Puede volar?", "¿Tiene superpoderes?", "¿Es un villano?",
+    "¿Murió?", "¿Es famoso?", "¿Es de Star Wars?", "¿Vivió en la Edad Media?", "¿Usa espada?",
+    "¿Es un líder?", "¿Tiene el pelo largo?", "¿Sale en películas?", "¿Es de Argentina?",
+    "¿Es una mujer científica?", "¿Es millonario?", "¿Es inglés?", "¿Lleva capa?",
+    "¿Es del Señor de los Anillos?", "¿Luchó por la libertad?", "¿Es un dios griego?",
+    "¿Fue presidente?", "¿Es pintor?", "¿Escribió libros?", "¿Es un animal?", "¿Es de Harry Potter?"
+]
+
+
+def corpus_preguntas() -> List[str]:
+    """Preguntas reales: sugerencias, huecos recientes y frecuentes de las métricas, más las de ejemplo."""
+    corpus = PREGUNTAS_EJEMPLO + GeneradorSugerencias.SUGERENCIAS_BASE
+    corpus += [h.get('pregunta_original', '') for h in registro_huecos.ultimos()]
+    corpus += [pregunta for pregunta, _ in metricas_guardadas()['preguntas_frecuentes'].top()]
+    return [p for p in corpus if p]
+
+
+def _medir_us(funcion, entradas: List, repeticiones: int) -> float:
+    """Microsegundos por llamada de funcion sobre cada entrada."""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for entrada in entradas:
+            funcion(entrada)
+    return round((time.perf_counter() - inicio) / (repeticiones * len(entradas)) * 1e6, 3)
+
+
+def benchmark_normalizador(repeticiones: int = 200) -> Dict:
+    corpus = corpus_preguntas()
+    identicos = all(Normalizador._normalizar(p) == Normalizador._normalizar_legacy(p) for p in corpus)
+    Normalizador.normalizar.cache_clear()
+    return {
+        'preguntas': len(corpus),
+        'repeticiones': repeticiones,
+        'identicos': identicos,
+        'legacy_us': _medir_us(Normalizador._normalizar_legacy, corpus, repeticiones),
+        'tabla_us': _medir_us(Normalizador._normalizar, corpus, repeticiones),
+        'tabla_con_cache_us': _medir_us(Normalizador.normalizar, corpus, repeticiones)
+    }
+
+
+def benchmark_serializacion(repeticiones: int = 200) -> Dict:
+    """
+    Coste por respuesta de cada acción del juego: jsonify de Flask, la capa
+    propia con json estándar y con orjson (si está), y para 'start' el
+    personaje ya serializado al cargar el roster. También el parseo de peticiones.
+    """
+    catalogo = CATALOGO
+    posiciones = list(range(min(len(catalogo), 200)))
+    personajes = [catalogo.personajes[i] for i in posiciones]
+    sugerencias = GeneradorSugerencias.SUGERENCIAS_BASE
+    cargas = {
+        'start': [{'character': p, 'message': 'Juego iniciado', 'session_id': 'default'} for p in personajes],
+        'start_token': [{'game_token': secrets.token_urlsafe(16), 'message': 'Juego iniciado'}],
+        'ask': [{'answer': 'Sí', 'clarification': ''},
+                {'answer': 'No lo sé', 'clarification': 'No estoy seguro de cómo interpretar eso. ¿Podrías reformularlo?'}],
+        'guess': [{'correct': False, 'character': p['nombre'], 'match': p['nombre'], 'score': 0.87} for p in personajes],
+        'suggestions': [{'suggestions': sugerencias[i:i + 5]} for i in range(0, len(sugerencias), 5)],
+        'hint': [{'hint': (p.get('pistas') or ['No hay más pistas disponibles.'])[0]} for p in personajes]
+    }
+    peticiones = [a_json({'action': 'ask', 'game_token': secrets.token_urlsafe(16), 'question': p})
+                  for p in PREGUNTAS_EJEMPLO]
+
+    def stdlib(carga):
+        return Response(_a_json_stdlib(carga), mimetype='application/json')
+
+    resultado = {'orjson': getattr(orjson, '__version__', None) if ORJSON is not None else None,
+                 'repeticiones': repeticiones, 'acciones': {}}
+    with app.test_request_context():
+        for accion, entradas in cargas.items():
+            medidas = {
+                'jsonify_us': _medir_us(jsonify, entradas, repeticiones),
+                'stdlib_us': _medir_us(stdlib, entradas, repeticiones),
+                'respuesta_json_us': _medir_us(respuesta_json, entradas, repeticiones)
+            }
+            if accion == 'start':
+                medidas['precompilado_us'] = _medir_us(
+                    lambda i: respuesta_json(b'{"character":' + catalogo.serializado(i) +
+                                             b',"message":"Juego iniciado","session_id":' + a_json('default') + b'}'),
+                    posiciones, repeticiones)
+            mejor = min(v for k, v in medidas.items() if k != 'jsonify_us')
+            medidas['ahorro_pct'] = round((1 - mejor / medidas['jsonify_us']) * 100, 1) if medidas['jsonify_us'] else 0.0
+            resultado['acciones'][accion] = medidas
+    resultado['parseo'] = {
+        'json_us': _medir_us(json.loads, peticiones, repeticiones),
+        'de_json_us': _medir_us(de_json, peticiones, repeticiones)
+    }
+    return resultado
+
+
+@contextmanager
+def entorno_aislado(directorio: str):
+    """
+    Sustituye sesiones, métricas y huecos por instancias nuevas que escriben
+    en 'directorio' (con el mismo tipo de almacén) mientras dura el bloque,
+    para que un benchmark no toque los datos reales.
+    """
+    global sesiones, metricas_manager, registro_huecos
+    originales = sesiones, metricas_manager, registro_huecos
+    if ALMACEN == 'sqlite':
+        ruta = os.path.join(directorio, os.path.basename(ALMACEN_SQLITE))
+        sesiones = AlmacenSesionesSQLite(ruta)
+        metricas_manager = MetricasManager(RegistroMetricasSQLite(ruta))
+    else:
+        sesiones = AlmacenSesiones()
+        metricas_manager = MetricasManager(RegistroMetricas(
+            os.path.join(directorio, os.path.basename(METRICAS_FILE)),
+            os.path.join(directorio, os.path.basename(METRICAS_LOG_FILE))))
+    registro_huecos = RegistroHuecos(os.path.join(directorio, os.path.basename(REGISTRO_HUECOS_FILE)))
+    try:
+        yield
+    finally:
+        registro_huecos.flush()
+        metricas_manager.cerrar()
+        atexit.unregister(registro_huecos.flush)
+        atexit.unregister(metricas_manager.cerrar)
+        sesiones, metricas_manager, registro_huecos = originales
+
+
+def sesiones_sinteticas(n: int, preguntas: int, corpus: List[str], rng: random.Random) -> List[Dict]:
+    """Partidas inventadas: preguntas del corpus, nivel de pista y si se acierta al adivinar."""
+    return [{
+        'preguntas': rng.sample(corpus, min(preguntas, len(corpus))),
+        'hint_level': rng.choice((1, 2)),
+        'acierta': rng.random() < 0.5
+    } for _ in range(n)]
+
+
+def sesiones_grabadas(ruta: str) -> List[Dict]:
+    """
+    Partidas grabadas en JSONL, una por línea con al menos 'preguntas'
+    (lista de textos o de {'pregunta': ...}, como las guarda MemoriaPartida)
+    y opcionalmente 'guess' y 'hint_level'.
+    """
+    partidas = []
+    with open(ruta, 'r', encoding='utf-8') as f:
+        for linea in f:
+            try:
+                datos = json.loads(linea)
+            except ValueError:
+                continue
+            preguntas = [p.get('pregunta', '') if isinstance(p, dict) else p for p in datos.get('preguntas', [])]
+            partidas.append({
+                'preguntas': [p for p in preguntas if p],
+                'hint_level': datos.get('hint_level', 1),
+                'guess': datos.get('guess')
+            })
+    return partidas
+
+
+def percentiles_ms(muestras: List[float]) -> Dict:
+    """Recuento, p50/p95/p99 y máximo (rango más cercano) de latencias en segundos."""
+    if not muestras:
+        return {'n': 0}
+    ordenadas = sorted(muestras)
+
+    def rango(p: float) -> float:
+        return round(ordenadas[max(0, math.ceil(p * len(ordenadas)) - 1)] * 1000, 3)
+
+    return {
+        'n': len(ordenadas),
+        'por_segundo': round(len(ordenadas) / sum(ordenadas), 1) if sum(ordenadas) else 0.0,
+        'p50_ms': rango(0.50),
+        'p95_ms': rango(0.95),
+        'p99_ms': rango(0.99),
+        'max_ms': round(ordenadas[-1] * 1000, 3)
+    }
+
+
+def reproducir_partidas(partidas: List[Dict], rng: random.Random) -> Dict:
+    """
+    Reproduce cada partida contra /api/oracle con el cliente de pruebas de
+    Flask (start → ask × N → suggestions → hint → guess) y mide cada petición.
+    """
+    cliente = app.test_client()
+    nombres = [p['nombre'] for p in CATALOGO.personajes]
+    latencias: Dict[str, List[float]] = defaultdict(list)
+    errores = 0
+
+    def pedir(accion: str, **datos) -> Dict:
+        nonlocal errores
+        inicio = time.perf_counter()
+        respuesta = cliente.post('/api/oracle', json={'action': accion, **datos})
+        latencias[accion].append(time.perf_counter() - inicio)
+        if respuesta.status_code != 200:
+            errores += 1
+        return respuesta.get_json() or {}
+
+    inicio = time.perf_counter()
+    for partida in partidas:
+        token = pedir('start', modo='token').get('game_token')
+        for pregunta in partida['preguntas']:
+            pedir('ask', game_token=token, question=pregunta)
+        pedir('suggestions', game_token=token, modo='inteligente')
+        pedir('hint', game_token=token, hint_level=partida.get('hint_level', 1))
+        intento = partida.get('guess')
+        if intento is None:
+            memoria = sesiones.obtener(token)
+            intento = memoria.personaje_nombre if partida.get('acierta') and memoria else rng.choice(nombres)
+        pedir('guess', game_token=token, guess=intento)
+    segundos = time.perf_counter() - inicio
+
+    peticiones = sum(len(m) for m in latencias.values())
+    return {
+        'partidas': len(partidas),
+        'peticiones': peticiones,
+        'errores': errores,
+        'segundos': round(segundos, 3),
+        'peticiones_por_segundo': round(peticiones / segundos, 1) if segundos else 0.0,
+        'acciones': {accion: percentiles_ms(muestras) for accion, muestras in latencias.items()}
+    }
+
+
+def micro_benchmarks(corpus: List[str], repeticiones: int, rng: random.Random) -> Dict:
+    """Coste por llamada de las piezas del camino caliente con el corpus real."""
+    muestra = rng.sample(CATALOGO.personajes, min(20, len(CATALOGO)))
+    pares = [(p, c) for p in corpus for c in muestra[:5]]
+    historiales = [rng.sample(corpus, min(k, len(corpus))) for k in (0, 3, 8, 15)]
+    Normalizador.normalizar.cache_clear()
+    normalizar_frio = _medir_us(Normalizador.normalizar, corpus, 1)
+    return {
+        'normalizar_frio_us': normalizar_frio,
+        'normalizar_us': _medir_us(Normalizador.normalizar, corpus, repeticiones),
+        'analizar_us': _medir_us(lambda par: analizador.analizar(*par), pares, max(1, repeticiones // 5)),
+        'generar_us': _medir_us(lambda hechas: generador.generar(hechas, 5), historiales, repeticiones)
+    }
+
+
+def benchmark_replay(partidas: int = 200, preguntas: int = 8, repeticiones: int = 50,
+                     semilla: int = 1, grabadas: Optional[str] = None) -> Dict:
+    """
+    Benchmark del camino caliente de /api/oracle: reproducción de partidas
+    (sintéticas o grabadas) y micro-benchmarks de analizar, normalizar y
+    generar. Todo se ejecuta en un entorno aislado en un directorio temporal.
+    """
+    import tempfile
+    rng = random.Random(semilla)
+    corpus = corpus_preguntas()
+    lista = sesiones_grabadas(grabadas) if grabadas else sesiones_sinteticas(partidas, preguntas, corpus, rng)
+    with tempfile.TemporaryDirectory(prefix='oracle-bench-') as directorio, open(os.devnull, 'w') as nulo:
+        # Los avisos por hueco se siguen imprimiendo (cuestan lo mismo) pero no ensucian el JSON
+        with entorno_aislado(directorio), redirect_stdout(nulo):
+            replay = reproducir_partidas(lista, rng)
+            micro = micro_benchmarks(corpus, repeticiones, rng)
+    return {
+        'entorno': {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'almacen': ALMACEN,
+            'personajes': len(CATALOGO),
+            'catalogo': CATALOGO.version,
+            'binario': CATALOGO.binario,
+            'semilla': semilla,
+            'origen': grabadas or 'sinteticas',
+            'corpus': len(corpus)
+        },
+        'replay': replay,
+        'micro': micro
+    }
+
+
+# ===================================================================
+# VERIFICACIÓN DEL MOTOR DE REGLAS
+# ===================================================================
+
+def preguntas_de_reglas(n: int, rng: random.Random) -> List[str]:
+    """Preguntas sintéticas: un término de cada grupo de una regla y, a veces, el de otra (prioridades)."""
+    reglas = AnalizadorPreguntas.motor.reglas
+    preguntas = []
+    for _ in range(n):
+        terminos = [rng.choice(grupo) for grupo in rng.choice(reglas).grupos]
+        if rng.random() < 0.5:
+            terminos.append(rng.choice(rng.choice(reglas).grupos[0]))
+        rng.shuffle(terminos)
+        preguntas.append(f"¿Es {' '.join(terminos)}?")
+    return preguntas
+
+
+# Pregunta -> regla con la que debe acabar resolviéndose vía lemas (None: debe
+# quedarse en hueco). Mejor un "No lo sé" que un Sí/No de otra regla.
+CASOS_LEMAS = [
+    ('¿Pintaba?', 'artista'),
+    ('¿Es escritora?', 'escritor'),
+    ('¿Es cientifco?', 'cientifico'),
+    ('¿Es famosa?', 'famoso'),
+    ('¿Gobernaba?', 'gobernante'),
+    ('¿Es espía?', None),
+    ('¿Es actor?', None),
+    ('¿Lidia con monstruos?', None),
+    ('¿Es bajista?', None),
+    ('¿Es autista?', None),
+]
+
+
+def verificar_lemas() -> List[Dict]:
+    """Los CASOS_LEMAS que no dan la regla esperada; lista vacía si todos la dan."""
+    fallos = []
+    for pregunta, esperada in CASOS_LEMAS:
+        texto, regla = AnalizadorPreguntas.lemas.regla_binaria(Normalizador.normalizar(pregunta))
+        obtenida = regla.id if regla else None
+        if obtenida != esperada:
+            fallos.append({'pregunta': pregunta, 'texto': texto, 'esperada': esperada, 'obtenida': obtenida})
+    return fallos
+
+
+def verificar_reglas(aleatorias: int = 3000, semilla: int = 1, mostrar: int = 20) -> Dict:
+    """
+    Motor compilado contra la cadena de ifs original (AnalizadorPreguntas.diferencias)
+    con las preguntas reales y 'aleatorias' sintéticas contra todo el roster,
+    más los casos del lematizador (CASOS_LEMAS).
+    """
+    preguntas = corpus_preguntas() + preguntas_de_reglas(aleatorias, random.Random(semilla))
+    personajes = CATALOGO.personajes
+    diferencias = AnalizadorPreguntas.diferencias(preguntas, personajes)
+    return {
+        'preguntas': len(preguntas),
+        'personajes': len(personajes),
+        'comparaciones': len(preguntas) * len(personajes),
+        'total_diferencias': len(diferencias),
+        'diferencias': diferencias[:mostrar],
+        'casos_lemas': len(CASOS_LEMAS),
+        'fallos_lemas': verificar_lemas() if ANALIZADOR_LEMAS else []
+    }
+
+
+# ===================================================================
+# COBERTURA DEL CORPUS
+# ===================================================================
+
+def leer_corpus(ruta: str) -> Iterator[Tuple[str, int]]:
+    """
+    (pregunta, peso) línea a línea: texto plano (una pregunta por línea) o
+    JSON lines como el log de huecos ('pregunta_original' o 'pregunta', y
+    'peso' opcional). '-' lee de la entrada estándar.
+    """
+    f = sys.stdin if ruta == '-' else open(ruta, 'r', encoding='utf-8')
+    try:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            if linea.startswith('{'):
+                try:
+                    datos = json.loads(linea)
+                except ValueError:
+                    continue
+                texto, peso = datos.get('pregunta_original') or datos.get('pregunta') or '', datos.get('peso', 1)
+            else:
+                texto, peso = linea, 1
+            if texto:
+                yield texto, int(peso)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def corpus_por_defecto() -> Iterator[Tuple[str, int]]:
+    """El log de huecos (rotado y actual) y después preguntas_frecuentes con su recuento."""
+    for archivo in (REGISTRO_HUECOS_FILE + '.1', REGISTRO_HUECOS_FILE):
+        if os.path.exists(archivo):
+            yield from leer_corpus(archivo)
+    yield from metricas_guardadas()['preguntas_frecuentes'].top()
+
+
+def _iniciar_cobertura(version: str):
+    """Inicializador de cada proceso del pool: el roster lo carga el propio import; tiene que ser el mismo."""
+    if CATALOGO.version != version:
+        raise RuntimeError(f"El roster cambió durante el análisis ({version} -> {CATALOGO.version})")
+
+
+def _cobertura_lote(textos: List[str]) -> List[Dict]:
+    """En cada proceso del pool: la fila de evaluar_lote de cada pregunta contra todo el roster."""
+    motor = AnalizadorPreguntas.motor
+    lote = evaluar_lote(textos, None, CATALOGO)
+    resultados = []
+    for texto, detalle, fila in zip(textos, lote['preguntas'], lote['respuestas']):
+        regla = detalle['regla']
+        sin_respuesta = fila.count('-')
+        if regla is None and sin_respuesta < len(fila):
+            # Reglas que dependen del personaje: se anota la primera que casa
+            candidatas = motor.candidatas(detalle['normalizada']) or \
+                motor.candidatas(AnalizadorPreguntas.lemas.expandir(detalle['normalizada']))
+            regla = candidatas[0].id if candidatas else None
+        resultados.append({
+            'pregunta': texto,
+            'normalizada': detalle['normalizada'],
+            'regla': regla,
+            'si': fila.count('S'),
+            'no': fila.count('N'),
+            'otras': fila.count('*'),
+            'sin_respuesta': sin_respuesta
+        })
+    return resultados
+
+
+def analizar_cobertura(corpus: Iterator[Tuple[str, int]], salida: Optional[str] = None, procesos: int = 0,
+                       lote: int = 1024, ventana: int = 10000, todas: bool = False) -> Dict:
+    """
+    Pasa el corpus por el analizador contra todos los personajes con un pool
+    de procesos. La memoria no depende del tamaño del corpus: la entrada se
+    lee en streaming, como mucho hay 2 lotes por proceso en vuelo, cada
+    pregunta procesada va directa a 'salida' (JSON lines; solo las que algún
+    personaje no puede responder, salvo con 'todas') y las repeticiones se
+    resuelven con una ventana LRU de 'ventana' preguntas. El resumen solo
+    acumula contadores por regla y por atributo.
+    """
+    procesos = procesos or os.cpu_count() or 1
+    recientes: 'OrderedDict[str, Tuple[Optional[str], bool, bool]]' = OrderedDict()
+    reglas_usadas: Counter = Counter()
+    totales = Counter()
+    destino = open(salida, 'w', encoding='utf-8') if salida else None
+
+    def contar(regla: Optional[str], completa: bool, nula: bool, peso: int):
+        totales['preguntas'] += peso
+        if regla:
+            reglas_usadas[regla] += peso
+        totales['sin_respuesta' if nula else 'respondidas' if completa else 'parciales'] += peso
+
+    def recoger(pesos: Counter, resultados: List[Dict]):
+        for resultado in resultados:
+            peso = pesos[resultado['pregunta']]
+            nula = resultado['sin_respuesta'] == len(CATALOGO)
+            completa = resultado['sin_respuesta'] == 0
+            contar(resultado['regla'], completa, nula, peso)
+            totales['procesadas'] += 1
+            recientes[resultado['pregunta']] = (resultado['regla'], completa, nula)
+            if len(recientes) > ventana:
+                recientes.popitem(last=False)
+            if destino and (todas or not completa):
+                destino.write(json.dumps(dict(resultado, peso=peso), ensure_ascii=False) + '\n')
+
+    contexto = None
+    if procesos > 1:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # spawn, no fork: este proceso ya tiene hilos en marcha (persistencia,
+        # sesiones, vigilante del roster) y un fork podría heredar un lock cogido
+        contexto = ProcessPoolExecutor(procesos, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_iniciar_cobertura, initargs=(CATALOGO.version,))
+    en_vuelo: deque = deque()
+
+    def enviar(pesos: Counter):
+        if contexto is None:
+            recoger(pesos, _cobertura_lote(list(pesos)))
+            return
+        en_vuelo.append((pesos, contexto.submit(_cobertura_lote, list(pesos))))
+        while len(en_vuelo) >= 2 * procesos:
+            pendientes, futuro = en_vuelo.popleft()
+            recoger(pendientes, futuro.result())
+
+    try:
+        pesos: Counter = Counter()
+        for texto, peso in corpus:
+            conocida = recientes.get(texto)
+            if conocida is not None:
+                recientes.move_to_end(texto)
+                contar(*conocida, peso)
+                continue
+            pesos[texto] += peso
+            if len(pesos) >= lote:
+                enviar(pesos)
+                pesos = Counter()
+        if pesos:
+            enviar(pesos)
+        while en_vuelo:
+            pendientes, futuro = en_vuelo.popleft()
+            recoger(pendientes, futuro.result())
+    finally:
+        if contexto is not None:
+            contexto.shutdown()
+        if destino:
+            destino.close()
+
+    # Atributos que faltan a los personajes en las reglas que el corpus sí usa
+    por_campo: Dict[str, Dict] = {}
+    reglas = {regla.id: regla for regla in REGLAS}
+    for regla_id, peso in reglas_usadas.items():
+        for personaje in CATALOGO.personajes:
+            for campo in reglas[regla_id].faltantes(personaje):
+                info = por_campo.setdefault(campo, {'campo': campo, 'reglas': set(), 'consultas': 0, 'personajes': set()})
+                info['personajes'].add(personaje.get('nombre', 'desconocido'))
+                if regla_id not in info['reglas']:
+                    info['reglas'].add(regla_id)
+                    info['consultas'] += peso
+    faltantes = sorted(por_campo.values(), key=lambda i: (-i['consultas'], -len(i['personajes'])))
+
+    total = totales['preguntas']
+    return {
+        'version': CATALOGO.version,
+        'personajes': len(CATALOGO),
+        'procesos': procesos,
+        'corpus': {
+            'preguntas': total,
+            'procesadas': totales['procesadas'],
+            'respondidas': totales['respondidas'],
+            'parciales': totales['parciales'],
+            'sin_respuesta': totales['sin_respuesta'],
+            'cobertura_pct': round(totales['respondidas'] / total * 100, 2) if total else 0
+        },
+        'reglas': {
+            'usadas': dict(reglas_usadas.most_common()),
+            'nunca_usadas': [regla.id for regla in REGLAS if regla.id not in reglas_usadas]
+        },
+        'atributos_faltantes': [{
+            'campo': info['campo'],
+            'reglas': sorted(info['reglas']),
+            'consultas': info['consultas'],
+            'personajes_sin': len(info['personajes']),
+            'ejemplos': sorted(info['personajes'])[:5]
+        } for info in faltantes],
+        'salida': salida
+    }
+
+
 # ===================================================================
 # MAIN
 # ===================================================================
 
-if __name__ == '__main__':
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='THE ORACLE - Backend')
+    comandos = parser.add_subparsers(dest='comando')
+    comandos.add_parser('servidor', help='Arranca el servidor (por defecto)')
+    bench_norm = comandos.add_parser('bench-normalizador', help='Compara el normalizador antiguo con el nuevo')
+    bench_norm.add_argument('--repeticiones', type=int, default=200)
+    bench_json = comandos.add_parser('bench-json', help='Mide la serialización de las respuestas del juego')
+    bench_json.add_argument('--repeticiones', type=int, default=200)
+    cobertura = comandos.add_parser('cobertura', help='Pasa un corpus de preguntas por el analizador contra todo el roster')
+    cobertura.add_argument('--corpus', action='append',
+                           help='Texto (una pregunta por línea) o JSON lines; "-" = stdin. '
+                                'Por defecto: log de huecos y preguntas_frecuentes')
+    cobertura.add_argument('--salida', help='JSON lines con cada pregunta que algún personaje no puede responder')
+    cobertura.add_argument('--todas', action='store_true', help='Escribe en --salida todas las preguntas procesadas')
+    cobertura.add_argument('--procesos', type=int, default=0, help='Procesos del pool (0 = uno por CPU)')
+    cobertura.add_argument('--lote', type=int, default=1024)
+    cobertura.add_argument('--ventana', type=int, default=10000, help='Preguntas recientes recordadas para no repetirlas')
+    bench = comandos.add_parser('bench', help='Reproduce partidas contra /api/oracle y mide latencias')
+    bench.add_argument('--partidas', type=int, default=200, help='Partidas sintéticas a reproducir')
+    bench.add_argument('--preguntas', type=int, default=8, help='Preguntas por partida sintética')
+    bench.add_argument('--grabadas', help='JSONL con partidas grabadas (sustituye a las sintéticas)')
+    bench.add_argument('--repeticiones', type=int, default=50)
+    bench.add_argument('--semilla', type=int, default=1)
+    bench.add_argument('--salida', help='Escribe el resultado JSON en este archivo')
+    verificar = comandos.add_parser('verificar-reglas',
+                                    help='Compara el motor de reglas con el analizador original y comprueba '
+                                         'los casos del lematizador; sale con 1 si algo falla')
+    verificar.add_argument('--aleatorias', type=int, default=3000, help='Preguntas sintéticas con términos de las reglas')
+    verificar.add_argument('--semilla', type=int, default=1)
+    compilar = comandos.add_parser('compilar-roster', help='Compila personajes.json al formato binario (mmap)')
+    compilar.add_argument('--origen', default=PERSONAJES_FILE)
+    compilar.add_argument('--destino', default=ROSTER_BINARIO_FILE)
+    args = parser.parse_args(argv)
+
+    if args.comando == 'bench-normalizador':
+        print(json.dumps(benchmark_normalizador(args.repeticiones), ensure_ascii=False, indent=2))
+        return
+
+    if args.comando == 'bench-json':
+        print(json.dumps(benchmark_serializacion(args.repeticiones), ensure_ascii=False, indent=2))
+        return
+
+    if args.comando == 'cobertura':
+        if args.corpus:
+            corpus = (entrada for ruta in args.corpus for entrada in leer_corpus(ruta))
+        else:
+            corpus = corpus_por_defecto()
+        resultado = analizar_cobertura(corpus, args.salida, args.procesos, args.lote, args.ventana, args.todas)
+        print(json.dumps(resultado, ensure_ascii=False, indent=2))
+        return
+
+    if args.comando == 'bench':
+        resultado = benchmark_replay(args.partidas, args.preguntas, args.repeticiones, args.semilla, args.grabadas)
+        texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+        if args.salida:
+            with open(args.salida, 'w', encoding='utf-8') as f:
+                f.write(texto + '\n')
+        print(texto)
+        return
+
+    if args.comando == 'verificar-reglas':
+        resultado = verificar_reglas(args.aleatorias, args.semilla)
+        print(json.dumps(resultado, ensure_ascii=False, indent=2))
+        if resultado['total_diferencias'] or resultado['fallos_lemas']:
+            sys.exit(1)
+        return
+
+    if args.comando == 'compilar-roster':
+        print(json.dumps(compilar_roster(args.origen, args.destino), ensure_ascii=False, indent=2))
+        return
+
     print("=" * 60)
     print("🧠 THE ORACLE - Backend HÍBRIDO")
     print("=" * 60)
     print(f"📡 Servidor: http://0.0.0.0:5000")
-    print(f"🎭 Personajes: {len(PERSONAJES)}")
+    print(f"🎭 Personajes: {len(CATALOGO)}")
     print(f"📊 Dashboard: http://0.0.0.0:5000/dashboard")
     print("✅ Sistema de métricas ACTIVADO")
     print("✅ Analizador con 60+ patrones")
@@ -1306,3 +5049,7 @@ if __name__ == '__main__':
     # Puerto para producción
     port = int(os.environ.get('PORT', 10000))
     app.run(host='0.0.0.0', port=port, debug=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -181,7 +181,7 @@ function stopBackgroundMusic() {
 // --- ESTADO ---
 let state = {
     questionCount: 0,
-    secretCharacter: null,
+    gameToken: null,
     isGameActive: false,
     isWaitingResponse: false,
     hintsUsed: 0,
@@ -270,7 +270,7 @@ async function startGame() {
         const response = await fetch(config.backendURL, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ action: 'start' })
+            body: JSON.stringify({ action: 'start', modo: 'token' })
         });
         
         const data = await response.json();
@@ -280,7 +280,8 @@ async function startGame() {
             return;
         }
         
-        state.secretCharacter = data.character;
+        // El personaje secreto se queda en el servidor; solo guardamos el token
+        state.gameToken = data.game_token;
         state.isGameActive = true;
         
         el.chatHistory.innerHTML = '';
@@ -318,13 +319,24 @@ async function askQuestion() {
             body: JSON.stringify({
                 action: 'ask',
                 question: question,
-                character: state.secretCharacter,
-                question_count: state.questionCount,
-                asked_questions: state.askedQuestions
+                game_token: state.gameToken
             })
         });
         
         const data = await response.json();
+        if (data.error) {
+            // Solo un 404 significa que la partida ya no existe
+            if (response.status === 404) {
+                addMessageWithBubble('La partida ha expirado. Inicia una nueva.', 'system');
+                state.isGameActive = false;
+            } else {
+                addMessageWithBubble('Error al procesar la pregunta. Inténtalo de nuevo.', 'system');
+                el.questionInput.disabled = false;
+                el.askBtn.disabled = false;
+            }
+            state.isWaitingResponse = false;
+            return;
+        }
         const fullAnswer = data.clarification ? `${data.answer} ${data.clarification}` : data.answer;
         
         if (data.answer === 'No lo sé' && data.clarification && data.clarification.includes('reformula')) {
@@ -371,9 +383,8 @@ async function getSuggestions() {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 action: 'suggestions',
-                character: state.secretCharacter,
-                question_count: state.questionCount,
-                asked_questions: state.askedQuestions
+                modo: 'inteligente',
+                game_token: state.gameToken
             })
         });
         
@@ -409,7 +420,7 @@ async function getHint() {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 action: 'hint',
-                character: state.secretCharacter,
+                game_token: state.gameToken,
                 hint_level: state.hintsUsed + 1
             })
         });
@@ -477,11 +488,17 @@ async function confirmGuess() {
             body: JSON.stringify({
                 action: 'guess',
                 guess: guess,
-                character: state.secretCharacter
+                game_token: state.gameToken
             })
         });
         
         const data = await response.json();
+        if (data.error) {
+            addMessageWithBubble(response.status === 404
+                ? 'La partida ha expirado. Inicia una nueva.'
+                : 'Error al verificar adivinanza.', 'system');
+            return;
+        }
         endGame(data.correct, data.character);
         
     } catch (error) {
@@ -509,7 +526,7 @@ function endGame(won, characterName) {
 function resetGame() {
     stopTimer();
     state.questionCount = 0;
-    state.secretCharacter = null;
+    state.gameToken = null;
     state.isGameActive = false;
     state.isWaitingResponse = false;
     state.hintsUsed = 0;